@@ -0,0 +1,224 @@
+"""Aggregate tables maintained as messages are logged.
+
+Hourly activity rollups are kept current by a trigger on messages. Daily word
+and bigram counts are computed in Python (tokenization is not expressible in
+SQL) by the chat log writer for each batch it inserts. Both can be rebuilt
+from the message history, archived months included.
+"""
+import time
+from collections import Counter
+from config import EXCLUDED_CHANNELS_FROM_TOPIC, REPORT_FETCH_SIZE, TOPIC_BASELINE_DAYS
+from heavy_hitters import SpaceSaving
+from text_analytics import tokenize
+
+SECONDS_PER_DAY = 86400
+
+UPSERT_DAILY_WORD_SQL = '''
+    INSERT INTO daily_words (day, word, count) VALUES (?, ?, ?)
+    ON CONFLICT (day, word) DO UPDATE SET count = count + excluded.count
+'''
+UPSERT_DAILY_BIGRAM_SQL = '''
+    INSERT INTO daily_bigrams (day, bigram, count) VALUES (?, ?, ?)
+    ON CONFLICT (day, bigram) DO UPDATE SET count = count + excluded.count
+'''
+UPSERT_DAILY_TOPIC_MESSAGES_SQL = '''
+    INSERT INTO daily_topic_messages (day, message_count) VALUES (?, ?)
+    ON CONFLICT (day) DO UPDATE SET message_count = message_count + excluded.message_count
+'''
+
+# Daily term table and column for each kind of heavy-hitter sketch
+TERM_TABLES = {
+    'words': ('daily_words', 'word'),
+    'bigrams': ('daily_bigrams', 'bigram'),
+}
+
+
+class DailyTermCounts:
+    """Accumulates per-day word, bigram and message counts for a set of messages."""
+
+    def __init__(self):
+        self.words = Counter()
+        self.bigrams = Counter()
+        self.messages = Counter()
+
+    def add(self, ts, content):
+        day = ts // SECONDS_PER_DAY
+        words = tokenize(content)
+        self.messages[day] += 1
+        self.words.update((day, w) for w in words)
+        self.bigrams.update((day, f"{a} {b}") for a, b in zip(words, words[1:]))
+
+    def write(self, conn):
+        """Add the accumulated counts to the daily tables (inside the caller's transaction)."""
+        if self.messages:
+            conn.executemany(UPSERT_DAILY_WORD_SQL, ((d, w, c) for (d, w), c in self.words.items()))
+            conn.executemany(UPSERT_DAILY_BIGRAM_SQL, ((d, b, c) for (d, b), c in self.bigrams.items()))
+            conn.executemany(UPSERT_DAILY_TOPIC_MESSAGES_SQL, self.messages.items())
+        self.words.clear()
+        self.bigrams.clear()
+        self.messages.clear()
+
+
+def rebuild_daily_terms(conn):
+    """Recompute the daily word/bigram tables from the messages table.
+
+    Messages are streamed in ts order and counts are flushed once per day, so
+    memory is bounded by a single day's vocabulary. Runs inside the caller's
+    transaction.
+    """
+    for table in ("daily_words", "daily_bigrams", "daily_topic_messages"):
+        conn.execute(f"DELETE FROM {table}")
+
+    excluded = sorted(EXCLUDED_CHANNELS_FROM_TOPIC)
+    placeholders = ', '.join('?' * len(excluded))
+    cursor = conn.execute(f'''
+        SELECT m.ts, m.content
+        FROM messages m
+        LEFT JOIN channels c ON c.channel_id = m.channel_id
+        WHERE COALESCE(c.channel_name, '') NOT IN ({placeholders})
+        ORDER BY m.ts
+    ''', excluded)
+
+    counts = DailyTermCounts()
+    current_day = None
+    total = 0
+    while True:
+        rows = cursor.fetchmany(REPORT_FETCH_SIZE)
+        if not rows:
+            break
+        for ts, content in rows:
+            day = ts // SECONDS_PER_DAY
+            if day != current_day:
+                counts.write(conn)
+                current_day = day
+            counts.add(ts, content)
+        total += len(rows)
+    counts.write(conn)
+    return total
+
+
+def update_term_baseline(conn, now=None, window_days=TOPIC_BASELINE_DAYS):
+    """Slide the document-frequency baseline to the `window_days` complete days before today.
+
+    A day is one document: term_baseline.days counts the baseline days a word
+    appeared on, and baseline_days lists the days folded in. Only days
+    entering or leaving the window are touched, straight from daily_words.
+    Runs inside the caller's transaction. Returns (days added, days removed).
+    """
+    today = int(now if now is not None else time.time()) // SECONDS_PER_DAY
+    first_day = today - window_days
+    folded = {row[0] for row in conn.execute("SELECT day FROM baseline_days")}
+    wanted = {row[0] for row in conn.execute(
+        "SELECT day FROM daily_topic_messages WHERE day >= ? AND day < ?", (first_day, today)
+    )}
+
+    for day in sorted(wanted - folded):
+        conn.execute('''
+            INSERT INTO term_baseline (word, days)
+            SELECT word, 1 FROM daily_words WHERE day = ?
+            ON CONFLICT (word) DO UPDATE SET days = days + 1
+        ''', (day,))
+        conn.execute("INSERT INTO baseline_days (day) VALUES (?)", (day,))
+    expired = sorted(folded - wanted)
+    for day in expired:
+        conn.execute('''
+            UPDATE term_baseline SET days = days - 1
+            WHERE word IN (SELECT word FROM daily_words WHERE day = ?)
+        ''', (day,))
+        conn.execute("DELETE FROM baseline_days WHERE day = ?", (day,))
+    if expired:
+        conn.execute("DELETE FROM term_baseline WHERE days <= 0")
+    return len(wanted - folded), len(expired)
+
+
+def rebuild_term_baseline(conn):
+    """Recompute the document-frequency baseline from the daily word counts."""
+    conn.execute("DELETE FROM term_baseline")
+    conn.execute("DELETE FROM baseline_days")
+    update_term_baseline(conn)
+
+
+def build_day_sketch(conn, kind, day, capacity):
+    """Space-Saving sketch of one day's word or bigram counts.
+
+    Built from the exact daily aggregate, so only the top `capacity` terms
+    are read and the tracked counts carry no error.
+    """
+    table, column = TERM_TABLES[kind]
+    total = conn.execute(f"SELECT COALESCE(SUM(count), 0) FROM {table} WHERE day = ?", (day,)).fetchone()[0]
+    rows = conn.execute(
+        f"SELECT {column}, count FROM {table} WHERE day = ? ORDER BY count DESC LIMIT ?",
+        (day, capacity)
+    )
+    return SpaceSaving.from_counts(rows, capacity, total)
+
+
+DAY_TABLES = ("daily_words", "daily_bigrams", "daily_topic_messages")
+
+
+def rebuild_day(conn, day, rows, excluded_channel_ids):
+    """Recompute one day's hourly rollups and term counts (inside the caller's transaction).
+
+    `rows` are that day's (id, ts, user_id, channel_id, content) messages,
+    live and archived. Returns the number of messages counted.
+    """
+    first_hour, end_hour = day * SECONDS_PER_DAY // 3600, (day + 1) * SECONDS_PER_DAY // 3600
+    conn.execute("DELETE FROM activity_user_hourly WHERE hour >= ? AND hour < ?", (first_hour, end_hour))
+    conn.execute("DELETE FROM activity_channel_hourly WHERE hour >= ? AND hour < ?", (first_hour, end_hour))
+    for table in DAY_TABLES:
+        conn.execute(f"DELETE FROM {table} WHERE day = ?", (day,))
+
+    users = Counter()
+    channels = Counter()
+    counts = DailyTermCounts()
+    for _, ts, user_id, channel_id, content in rows:
+        users[(ts // 3600, user_id)] += 1
+        channels[(ts // 3600, channel_id)] += 1
+        if channel_id not in excluded_channel_ids:
+            counts.add(ts, content)
+    conn.executemany(
+        "INSERT INTO activity_user_hourly (hour, user_id, message_count) VALUES (?, ?, ?)",
+        ((hour, user_id, n) for (hour, user_id), n in users.items())
+    )
+    conn.executemany(
+        "INSERT INTO activity_channel_hourly (hour, channel_id, message_count) VALUES (?, ?, ?)",
+        ((hour, channel_id, n) for (hour, channel_id), n in channels.items())
+    )
+    counts.write(conn)
+    return len(rows)
+
+
+def rebuild_aggregates(db, iter_messages, first_day, last_day):
+    """Recompute every aggregate table from the message history, one day at a time.
+
+    iter_messages(start, end, conn) yields a range's messages from the live
+    table and the archives (see ChatArchiver.iter_messages). Each day is
+    read and rewritten in its own transaction under the write lock, which is
+    released between days so the chat log writer is never blocked for long.
+    Rows outside [first_day, last_day] are dropped. Returns the number of
+    messages counted.
+    """
+    first_hour, end_hour = first_day * SECONDS_PER_DAY // 3600, (last_day + 1) * SECONDS_PER_DAY // 3600
+    with db.write() as conn, conn:
+        conn.execute("DELETE FROM activity_user_hourly WHERE hour < ? OR hour >= ?", (first_hour, end_hour))
+        conn.execute("DELETE FROM activity_channel_hourly WHERE hour < ? OR hour >= ?", (first_hour, end_hour))
+        for table in DAY_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE day < ? OR day > ?", (first_day, last_day))
+        excluded = sorted(EXCLUDED_CHANNELS_FROM_TOPIC)
+        excluded_channel_ids = {row[0] for row in conn.execute(
+            f"SELECT channel_id FROM channels WHERE channel_name IN ({', '.join('?' * len(excluded))})", excluded
+        )}
+
+    total = 0
+    for day in range(first_day, last_day + 1):
+        with db.write() as conn:
+            # Read before the transaction opens: archives cannot be attached inside one
+            rows = list(iter_messages(day * SECONDS_PER_DAY, (day + 1) * SECONDS_PER_DAY, conn))
+            with conn:
+                total += rebuild_day(conn, day, rows, excluded_channel_ids)
+
+    with db.write() as conn, conn:
+        # Stored sketches and the baseline were derived from the old daily counts
+        conn.execute("DELETE FROM daily_term_sketches")
+        rebuild_term_baseline(conn)
+    return total
@@ -1,11 +1,96 @@
 import aiohttp
 import asyncio
+import hashlib
+import json
 import logging
-from typing import Dict, Any, Optional
-from config import GROQ_URL, PERPLEXITY_URL, JOKE_API_URL, EIGHTBALL_API_URL
+import random
+import time
+from collections import deque
+from typing import Dict, Any, AsyncIterator, Optional
+from circuit_breaker import build_breakers
+from config import (
+    EIGHTBALL_API_URL,
+    GROQ_URL,
+    HTTP_CONNECT_TIMEOUT,
+    JOKE_API_URL,
+    JOKE_CACHE_SIZE,
+    LLM_LIMITS,
+    PERPLEXITY_URL,
+)
+from http_sessions import SessionManager
+from llm_profiles import ProfileStats, RequestProfile, estimate_usage, load_profiles
+from llm_scheduler import PRIORITY_INTERACTIVE, LLMScheduler, RetryableError, parse_retry_after
 
 logger = logging.getLogger(__name__)
 
+# Answered locally while the 8-ball API is unavailable
+EIGHT_BALL_ANSWERS = [
+    "It is certain.", "It is decidedly so.", "Without a doubt.", "Yes, definitely.",
+    "You may rely on it.", "As I see it, yes.", "Most likely.", "Outlook good.",
+    "Yes.", "Signs point to yes.", "Reply hazy, try again.", "Ask again later.",
+    "Better not tell you now.", "Cannot predict now.", "Concentrate and ask again.",
+    "Don't count on it.", "My reply is no.", "My sources say no.", "Outlook not so good.",
+    "Very doubtful.",
+]
+
+class StreamInterrupted(Exception):
+    """A streamed completion failed before it finished (the error has been logged)."""
+
+
+def _raise_for_status(response: aiohttp.ClientResponse) -> None:
+    """Raise RetryableError for 429 and 5xx responses, ClientResponseError for other failures."""
+    if response.status == 429 or response.status >= 500:
+        raise RetryableError(f"HTTP {response.status}", parse_retry_after(response.headers.get("Retry-After")))
+    response.raise_for_status()
+
+
+def payload_fingerprint(payload: dict) -> str:
+    """Stable hash of a request body (model, messages, sampling params)."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class _SharedStream:
+    """Fans one upstream completion stream out to every caller that asked for it.
+
+    Fragments are kept, so a caller joining late still receives the whole text.
+    """
+
+    def __init__(self):
+        self.fragments = []
+        self.done = False
+        self.failed = False
+        self.model = None       # Model whose stream is relayed, once one shows text
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def pump(self, source: AsyncIterator[str]) -> None:
+        try:
+            async for fragment in source:
+                self.fragments.append(fragment)
+                self._notify()
+        except StreamInterrupted:
+            self.failed = True
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            changed = self._changed
+            while position < len(self.fragments):
+                yield self.fragments[position]
+                position += 1
+            if self.done:
+                if self.failed:
+                    raise StreamInterrupted()
+                return
+            await changed.wait()
+
+
 class APIClient:
     def __init__(self, groq_key: str, perplexity_key: str):
         self.groq_headers = {
@@ -16,34 +101,328 @@ class APIClient:
             "Authorization": f"Bearer {perplexity_key}",
             "Content-Type": "application/json"
         }
-        self.session = None
+        self.sessions = SessionManager()
+        self.schedulers = {name: LLMScheduler(name, **limits) for name, limits in LLM_LIMITS.items()}
+        self.profiles = load_profiles()
+        self.profile_stats = {name: ProfileStats() for name in self.profiles}
+        # Open breakers make calls fail fast with a local fallback instead of waiting out timeouts
+        self.breakers = build_breakers()
+        self._recent_jokes = deque(maxlen=JOKE_CACHE_SIZE)
+        # Single-flight: identical requests in flight share one upstream call
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._inflight_streams: Dict[str, _SharedStream] = {}
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
     
-    async def make_groq_request(self, messages: list, model: str = "openai/gpt-oss-120b") -> Optional[str]:
-        """Make async request to Groq API."""
-        data = {
-            "model": model,
-            "messages": messages,
-            "temperature": 1,
-            "max_completion_tokens": 8192,
-            "top_p": 1,
-            "reasoning_effort": "medium",
-            "stream": False,
-            "stop": None
-        }
-        
+    async def make_groq_request(self, messages: list, profile: str = "chat",
+                                priority: int = PRIORITY_INTERACTIVE, info: Optional[dict] = None) -> Optional[str]:
+        """Make async request to Groq API using a named request profile.
+
+        The request is queued in the Groq scheduler at `priority` and gives up
+        after the profile's deadline. If the profile has a hedge model and the
+        primary has not answered by its p95 latency, a backup request to the
+        hedge model is raced against it. Concurrent calls with an identical
+        payload share a single upstream request and all receive its result.
+        Returns None at once while the Groq circuit breaker is open. If `info`
+        is given, its 'model' is set to the model that answered.
+        """
+        spec = self.profiles[profile]
+        key = payload_fingerprint(spec.payload(messages))
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced_calls += 1
+            logger.debug("Coalesced Groq request %s", key[:12])
+        elif not self.breakers["groq"].allow():
+            logger.debug("Groq circuit open, skipping %s request", profile)
+            return None
+        else:
+            inflight = asyncio.ensure_future(self._hedged_groq(spec, messages, priority))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one caller giving up does not cancel the request for the others
+        content, model = await asyncio.shield(inflight)
+        if info is not None:
+            info['model'] = model
+        return content
+
+    async def _hedged_groq(self, spec: RequestProfile, messages: list, priority: int):
+        """(content, model that answered); (None, None) on failure."""
+        stats = self.profile_stats[spec.name]
+        stats.requests += 1
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            async with self.session.post(GROQ_URL, headers=self.groq_headers, json=data, timeout=30) as response:
-                    response.raise_for_status()
-                    response_json = await response.json()
-                    return response_json['choices'][0]['message']['content']
-        except (aiohttp.ClientError, KeyError, asyncio.TimeoutError) as e:
+            return await asyncio.wait_for(self._race_groq(spec, messages, priority, stats), spec.deadline)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            self.breakers["groq"].record(False, spec.deadline)
+            logger.warning("Groq %s request missed its %ss deadline", spec.name, spec.deadline)
+            return None, None
+
+    async def _race_groq(self, spec: RequestProfile, messages: list, priority: int, stats: ProfileStats):
+        start = time.monotonic()
+        primary = asyncio.ensure_future(self._post_groq(spec.payload(messages), priority))
+        pending = {primary}
+        try:
+            hedge_after = stats.hedge_delay() if spec.hedge_model else None
+            if hedge_after is not None:
+                done, _ = await asyncio.wait(pending, timeout=hedge_after)
+                if not done:
+                    stats.hedges += 1
+                    logger.debug("Groq %s request slower than p95 (%.1fs), hedging with %s",
+                                 spec.name, hedge_after, spec.hedge_model)
+                    pending.add(asyncio.ensure_future(
+                        self._post_groq(spec.payload(messages, model=spec.hedge_model), priority)))
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    content, usage, model = task.result()
+                    stats.record_usage(model, usage)
+                    elapsed = time.monotonic() - start
+                    if task is primary:
+                        stats.primary_latencies.append(elapsed)
+                    if content:
+                        if task is not primary:
+                            stats.hedge_wins += 1
+                        stats.latencies.append(elapsed)
+                        return content, model
+            stats.failures += 1
+            return None, None
+        finally:
+            for task in pending:
+                if task is primary:
+                    stats.primary_latencies.append(time.monotonic() - start)
+                task.cancel()
+
+    async def _post_groq(self, data: dict, priority: int):
+        """One non-streamed completion. Returns (content, usage, model); content is None on failure."""
+        attempt_started = 0.0
+
+        async def call():
+            nonlocal attempt_started
+            attempt_started = time.monotonic()
+            try:
+                async with self.sessions.session("groq").post(GROQ_URL, headers=self.groq_headers, json=data) as response:
+                    _raise_for_status(response)
+                    return await response.json()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                raise RetryableError(repr(e)) from e
+
+        self.upstream_calls += 1
+        try:
+            response_json = await self.schedulers["groq"].run(call, priority)
+            content = response_json['choices'][0]['message']['content']
+        except (RetryableError, aiohttp.ClientError, KeyError, IndexError) as e:
             logger.warning("Groq API error", exc_info=True)
-            return None
+            self.breakers["groq"].record(False, time.monotonic() - attempt_started)
+            return None, None, data['model']
+        self.breakers["groq"].record(True, time.monotonic() - attempt_started)
+        return content, response_json.get('usage'), data['model']
     
-    async def make_perplexity_request(self, messages: list) -> Optional[str]:
-        """Make async request to Perplexity API."""
+    async def stream_groq_request(self, messages: list, profile: str = "chat",
+                                  priority: int = PRIORITY_INTERACTIVE,
+                                  info: Optional[dict] = None) -> AsyncIterator[str]:
+        """Stream a Groq chat completion, yielding content fragments as they arrive.
+
+        Consumes the server-sent event stream of the chat completions
+        endpoint. API errors are logged and raised as StreamInterrupted,
+        possibly after some fragments were already yielded. The stream holds
+        a Groq scheduler slot until it ends; it is retried only if it fails
+        before the first fragment, and is cut off with StreamInterrupted at
+        the profile's deadline. If the profile has a hedge model and no text
+        has arrived by the primary's p95 time to first text, a backup stream
+        is started and whichever shows text first is kept (hedging stops
+        there: text already shown cannot be swapped for another model's).
+        Concurrent identical requests share one upstream stream. Raises
+        StreamInterrupted at once while the Groq circuit breaker is open. If
+        `info` is given, its 'model' is set to the model that answered once
+        the stream has ended.
+        """
+        spec = self.profiles[profile]
+        data = spec.payload(messages, stream=True)
+        key = payload_fingerprint(data)
+        shared = self._inflight_streams.get(key)
+        # A finished stream can linger until its pump's done callback runs; never replay it
+        if shared is not None and not shared.done:
+            self.coalesced_calls += 1
+            logger.debug("Coalesced Groq stream %s", key[:12])
+        elif not self.breakers["groq"].allow():
+            logger.debug("Groq circuit open, skipping %s stream", profile)
+            raise StreamInterrupted()
+        else:
+            self.upstream_calls += 1
+            shared = _SharedStream()
+            self._inflight_streams[key] = shared
+            pump = asyncio.ensure_future(shared.pump(self._hedged_stream(spec, messages, priority, shared)))
+            pump.add_done_callback(lambda _: self._forget_stream(key, shared))
+        async for fragment in shared.subscribe():
+            yield fragment
+        if info is not None:
+            info['model'] = shared.model
+
+    def _forget_stream(self, key: str, shared: _SharedStream) -> None:
+        # A newer stream for the same payload may already have taken the slot
+        if self._inflight_streams.get(key) is shared:
+            del self._inflight_streams[key]
+
+    async def _hedged_stream(self, spec: RequestProfile, messages: list, priority: int,
+                             shared: _SharedStream) -> AsyncIterator[str]:
+        stats = self.profile_stats[spec.name]
+        stats.requests += 1
+        start = time.monotonic()
+        deadline = start + spec.deadline
+        primary = self._stream_groq(spec.payload(messages, stream=True), priority, stats)
+        streams = [primary]
+        # Task awaiting a stream's first fragment -> that stream
+        starting = {asyncio.ensure_future(primary.__anext__()): primary}
+        winner = None
+
+        async def release(keep=None):
+            for task, stream in starting.items():
+                if stream is primary and not task.done():
+                    stats.primary_latencies.append(time.monotonic() - start)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            starting.clear()
+            # Closing releases each stream's scheduler slot and connection
+            for stream in streams:
+                if stream is not keep:
+                    await stream.aclose()
+
+        try:
+            hedge_after = stats.hedge_delay() if spec.hedge_model else None
+            if hedge_after is not None and start + hedge_after < deadline:
+                done, _ = await asyncio.wait(starting, timeout=hedge_after)
+                if not done:
+                    stats.hedges += 1
+                    self.upstream_calls += 1
+                    logger.debug("Groq %s stream slower than p95 to first text (%.1fs), hedging with %s",
+                                 spec.name, hedge_after, spec.hedge_model)
+                    backup = self._stream_groq(spec.payload(messages, stream=True, model=spec.hedge_model),
+                                               priority, stats)
+                    streams.append(backup)
+                    starting[asyncio.ensure_future(backup.__anext__())] = backup
+
+            failed = False
+            while starting and winner is None:
+                done, _ = await asyncio.wait(starting, timeout=max(0.0, deadline - time.monotonic()),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    stream = starting.pop(task)
+                    elapsed = time.monotonic() - start
+                    if stream is primary:
+                        stats.primary_latencies.append(elapsed)
+                    try:
+                        fragment = task.result()
+                    except StopAsyncIteration:
+                        continue
+                    except StreamInterrupted:
+                        failed = True
+                        continue
+                    if winner is None:
+                        winner, first = stream, fragment
+                        shared.model = spec.model if stream is primary else spec.hedge_model
+                        stats.latencies.append(elapsed)
+                        if stream is not primary:
+                            stats.hedge_wins += 1
+            if winner is None:
+                if failed:
+                    raise StreamInterrupted()
+                return
+            # Drop the loser now, not when the winner's reply is done
+            await release(keep=winner)
+
+            yield first
+            while True:
+                try:
+                    fragment = await asyncio.wait_for(winner.__anext__(), max(0.0, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    return
+                yield fragment
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            self.breakers["groq"].record(False, spec.deadline)
+            logger.warning("Groq %s stream missed its %ss deadline", spec.name, spec.deadline)
+            raise StreamInterrupted()
+        except StreamInterrupted:
+            stats.failures += 1
+            raise
+        finally:
+            await release()
+
+    async def _stream_groq(self, data: dict, priority: int, stats: ProfileStats) -> AsyncIterator[str]:
+        # No socket-level total timeout: the profile deadline bounds the stream (see _hedged_stream)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=30)
+        scheduler = self.schedulers["groq"]
+        yielded = False
+        breaker = self.breakers["groq"]
+        answered = usage_seen = False   # answered: Groq accepted the request and bills for it
+        text = []
+
+        try:
+            for attempt in range(scheduler.max_retries + 1):
+                try:
+                    async with scheduler.slot(priority):
+                        attempt_started = time.monotonic()
+                        async with self.sessions.session("groq").post(GROQ_URL, headers=self.groq_headers, json=data, timeout=timeout) as response:
+                            _raise_for_status(response)
+                            answered = True
+                            async for line in response.content:
+                                line = line.strip()
+                                if not line.startswith(b"data:"):
+                                    continue
+                                payload = line[len(b"data:"):].strip()
+                                if payload == b"[DONE]":
+                                    break
+                                chunk = json.loads(payload)
+                                # Groq reports token usage on the final chunk
+                                usage = chunk.get('usage') or chunk.get('x_groq', {}).get('usage')
+                                if usage:
+                                    usage_seen = True
+                                    stats.record_usage(data['model'], usage)
+                                if not chunk['choices']:
+                                    continue
+                                delta = chunk['choices'][0].get('delta', {})
+                                if delta.get('content'):
+                                    if not yielded:
+                                        # The breaker judges a stream by its time to first text
+                                        breaker.record(True, time.monotonic() - attempt_started)
+                                    yielded = True
+                                    text.append(delta['content'])
+                                    yield delta['content']
+                    if not yielded:
+                        breaker.record(True, time.monotonic() - attempt_started)
+                    return
+                except (RetryableError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if yielded or attempt == scheduler.max_retries:
+                        logger.warning("Groq streaming API error", exc_info=True)
+                        scheduler.failures += 1
+                        breaker.record(False, time.monotonic() - attempt_started)
+                        raise StreamInterrupted() from e
+                    delay = scheduler.backoff(attempt, getattr(e, 'retry_after', None))
+                    scheduler.retries += 1
+                    logger.info("Groq stream failed to start (%r), retry %d/%d in %.1fs",
+                                e, attempt + 1, scheduler.max_retries, delay)
+                except (aiohttp.ClientError, KeyError, IndexError, ValueError) as e:
+                    logger.warning("Groq streaming API error", exc_info=True)
+                    breaker.record(False, time.monotonic() - attempt_started)
+                    raise StreamInterrupted() from e
+                await asyncio.sleep(delay)
+        finally:
+            if answered and not usage_seen:
+                # Closed before Groq's final chunk (lost a hedge race, cut off at the deadline):
+                # the usage is never reported, so charge an estimate
+                stats.record_usage(data['model'], estimate_usage(data['messages'], ''.join(text)))
+
+    async def make_perplexity_request(self, messages: list, priority: int = PRIORITY_INTERACTIVE) -> Optional[str]:
+        """Make async request to Perplexity API, queued in its scheduler at `priority`.
+
+        Returns None at once while the Perplexity circuit breaker is open.
+        """
+        breaker = self.breakers["perplexity"]
+        if not breaker.allow():
+            return None
         payload = {
             "model": "llama-3.1-sonar-small-128k-online",
             "messages": messages,
@@ -61,53 +440,94 @@ class APIClient:
             "frequency_penalty": 1
         }
         
-        try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            async with self.session.post(PERPLEXITY_URL, headers=self.perplexity_headers, json=payload, timeout=60) as response:
-                    response.raise_for_status()
+        attempt_started = 0.0
+
+        async def call():
+            nonlocal attempt_started
+            attempt_started = time.monotonic()
+            try:
+                async with self.sessions.session("perplexity").post(PERPLEXITY_URL, headers=self.perplexity_headers, json=payload) as response:
+                    _raise_for_status(response)
                     response_json = await response.json()
                     return response_json['choices'][0]['message']['content']
-        except (aiohttp.ClientError, KeyError, asyncio.TimeoutError) as e:
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                raise RetryableError(repr(e)) from e
+
+        try:
+            content = await self.schedulers["perplexity"].run(call, priority)
+        except (RetryableError, aiohttp.ClientError, KeyError) as e:
             logger.warning("Perplexity API error", exc_info=True)
+            breaker.record(False, time.monotonic() - attempt_started)
             return None
+        breaker.record(True, time.monotonic() - attempt_started)
+        return content
     
     async def get_joke(self) -> str:
-        """Get a joke from the joke API."""
-        headers = {"Accept": "application/json"}
-        
-        try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            async with self.session.get(JOKE_API_URL, headers=headers, timeout=10) as response:
-                    if response.status == 200:
-                        joke_data = await response.json()
-                        return joke_data['joke']
-                    else:
-                        return f"Error: Failed to fetch joke. Status code: {response.status}"
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            logger.warning("Joke API error", exc_info=True)
-            return "Sorry, couldn't fetch a joke right now."
+        """Get a joke from the joke API, or a recently fetched one while it is unavailable."""
+        breaker = self.breakers["joke"]
+        if breaker.allow():
+            headers = {"Accept": "application/json"}
+            start = time.monotonic()
+            joke = None
+            try:
+                async with self.sessions.session("joke").get(JOKE_API_URL, headers=headers) as response:
+                        if response.status == 200:
+                            joke_data = await response.json()
+                            joke = joke_data['joke']
+                        else:
+                            logger.warning("Joke API returned status %s", response.status)
+            except (aiohttp.ClientError, KeyError, asyncio.TimeoutError) as e:
+                logger.warning("Joke API error", exc_info=True)
+            breaker.record(joke is not None, time.monotonic() - start)
+            if joke is not None:
+                self._recent_jokes.append(joke)
+                return joke
+
+        if self._recent_jokes:
+            return random.choice(self._recent_jokes)
+        return "Sorry, couldn't fetch a joke right now."
     
     async def get_eight_ball_response(self, question: str) -> str:
-        """Get an 8-ball response."""
-        params = {"question": question}
-        
-        try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            async with self.session.get(EIGHTBALL_API_URL, params=params, timeout=10) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result.get('reading', 'Magic 8-ball is unclear')
-                    else:
-                        return "The magic 8-ball is not responding."
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            logger.warning("8-ball API error", exc_info=True)
-            return "The magic 8-ball is not responding."
+        """Get an 8-ball response, answered locally while the 8-ball API is unavailable."""
+        breaker = self.breakers["eightball"]
+        if breaker.allow():
+            params = {"question": question}
+            start = time.monotonic()
+            reading = None
+            try:
+                async with self.sessions.session("eightball").get(EIGHTBALL_API_URL, params=params) as response:
+                        if response.status == 200:
+                            result = await response.json()
+                            reading = result.get('reading', 'Magic 8-ball is unclear')
+                        else:
+                            logger.warning("8-ball API returned status %s", response.status)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("8-ball API error", exc_info=True)
+            breaker.record(reading is not None, time.monotonic() - start)
+            if reading is not None:
+                return reading
+
+        return random.choice(EIGHT_BALL_ANSWERS)
+
+    async def prewarm(self):
+        """Open pooled connections to every API host ahead of user traffic."""
+        await self.sessions.prewarm()
+
+    def connection_stats(self):
+        return self.sessions.stats()
+
+    def scheduler_stats(self):
+        return {name: scheduler.stats() for name, scheduler in self.schedulers.items()}
+
+    def breaker_stats(self):
+        return {name: breaker.stats() for name, breaker in self.breakers.items()}
+
+    def profile_stats_summary(self):
+        return {name: stats.as_dict() for name, stats in self.profile_stats.items()}
+
+    def coalescing_stats(self):
+        return {'upstream_calls': self.upstream_calls, 'coalesced_calls': self.coalesced_calls}
 
     async def close(self):
-        """Close the aiohttp session."""
-        if self.session:
-            await self.session.close()
-            self.session = None
\ No newline at end of file
+        """Close the aiohttp sessions."""
+        await self.sessions.close()
\ No newline at end of file
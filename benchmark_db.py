@@ -0,0 +1,164 @@
+"""Micro-benchmark: per-call sqlite3 connections vs the shared Database layer.
+
+Measures chat message inserts per second and weekly report query latency for
+the old pattern (a fresh connection per call, rollback journal, no pragmas,
+denormalized chat_messages table) and for ChatLogger and the shared read
+connection provided by db.Database on the migrated schema. Also reports the
+database file size before and after migration.
+
+Usage: python benchmark_db.py [--inserts N] [--rows N] [--queries N]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from chat_logger import ChatLogger
+from db import close_databases, get_database
+
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        username TEXT NOT NULL,
+        channel_id TEXT NOT NULL,
+        channel_name TEXT NOT NULL,
+        message_content TEXT NOT NULL
+    )
+'''
+
+WEEKLY_QUERY_SQL = '''
+    SELECT user_id, username, message_content, channel_name
+    FROM chat_messages
+    WHERE timestamp >= ?
+    ORDER BY timestamp DESC
+'''
+
+WORDS = ("linux kernel bash grep systemd nginx docker podman selinux firewall "
+         "ansible terraform ssh vim emacs lab book question answer server").split()
+CHANNELS = ["general", "linux-help", "labs", "sandbox", "off-topic"]
+
+
+def _random_message(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 25)))
+
+
+def _legacy_insert(db_path, user_id, username, channel_id, channel_name, content):
+    """The pre-Database pattern: connect, insert, commit, close."""
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('''
+            INSERT INTO chat_messages (timestamp, user_id, username, channel_id, channel_name, message_content)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (datetime.now(timezone.utc).isoformat(), str(user_id), username, str(channel_id), channel_name, content))
+        conn.commit()
+    conn.close()
+
+
+def _week_ago():
+    return (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+
+
+def _legacy_weekly_query(db_path):
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(WEEKLY_QUERY_SQL, (_week_ago(),)).fetchall()
+    conn.close()
+    return rows
+
+
+def _shared_weekly_query(db):
+    since = int((datetime.now(timezone.utc) - timedelta(days=7)).timestamp())
+    return db.reader().execute('''
+        SELECT m.user_id, u.username, m.content, c.channel_name
+        FROM messages m
+        LEFT JOIN users u ON u.user_id = m.user_id
+        LEFT JOIN channels c ON c.channel_id = m.channel_id
+        WHERE m.ts >= ?
+        ORDER BY m.ts DESC
+    ''', (since,)).fetchall()
+
+
+def _seed(db_path, rows, rng):
+    """Bulk-load `rows` messages spread over the last 30 days into the indexed legacy table."""
+    now = datetime.now(timezone.utc)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(CREATE_TABLE_SQL)
+        conn.executemany('''
+            INSERT INTO chat_messages (timestamp, user_id, username, channel_id, channel_name, message_content)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (
+            ((now - timedelta(seconds=rng.randint(0, 30 * 86400))).isoformat(),
+             str(uid), f"user{uid}", str(CHANNELS.index(ch)), ch, _random_message(rng))
+            for uid, ch in ((rng.randint(1, 500), rng.choice(CHANNELS)) for _ in range(rows))
+        ))
+        conn.execute("CREATE INDEX idx_chat_messages_timestamp ON chat_messages (timestamp)")
+        conn.execute("CREATE INDEX idx_chat_messages_channel_ts ON chat_messages (channel_name, timestamp)")
+        conn.execute("CREATE INDEX idx_chat_messages_user_ts ON chat_messages (user_id, timestamp)")
+    conn.close()
+
+
+def _bench_inserts(label, insert, count, rng, finish=None):
+    messages = [(rng.randint(1, 500), rng.choice(CHANNELS), _random_message(rng)) for _ in range(count)]
+    start = time.perf_counter()
+    for uid, ch, content in messages:
+        insert(uid, f"user{uid}", CHANNELS.index(ch), ch, content)
+    if finish:
+        finish()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<34} {count / elapsed:>12,.0f} inserts/s")
+
+
+def _bench_queries(label, query, count):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        query()
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"  {label:<34} median {statistics.median(timings):>8.1f} ms   max {max(timings):>8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--inserts', type=int, default=2000, help="messages to insert per mode")
+    parser.add_argument('--rows', type=int, default=100000, help="rows to seed for the query benchmark")
+    parser.add_argument('--queries', type=int, default=10, help="weekly queries to time per mode")
+    args = parser.parse_args()
+    rng = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Inserts ({args.inserts} messages)")
+        legacy_path = os.path.join(tmp, 'legacy.db')
+        with sqlite3.connect(legacy_path) as conn:
+            conn.execute(CREATE_TABLE_SQL)
+        conn.close()
+        _bench_inserts("per-call connection", lambda *a: _legacy_insert(legacy_path, *a), args.inserts, rng)
+
+        sync_logger = ChatLogger(os.path.join(tmp, 'sync.db'), write_behind=False)
+        _bench_inserts("persistent connection (sync)", sync_logger.log_message, args.inserts, rng)
+
+        batched_logger = ChatLogger(os.path.join(tmp, 'batched.db'), write_behind=True,
+                                    max_queue=args.inserts)
+        _bench_inserts("write-behind (incl. final flush)", batched_logger.log_message, args.inserts, rng,
+                       finish=batched_logger.close)
+
+        print(f"\nWeekly query ({args.rows} rows seeded over 30 days)")
+        seeded_path = os.path.join(tmp, 'seeded.db')
+        _seed(seeded_path, args.rows, rng)
+        _bench_queries("per-call connection", lambda: _legacy_weekly_query(seeded_path), args.queries)
+        legacy_size = os.path.getsize(seeded_path)
+        seeded_db = get_database(seeded_path)
+        _bench_queries("shared Database reader", lambda: _shared_weekly_query(seeded_db), args.queries)
+
+        print(f"\nFile size ({args.rows} rows)")
+        print(f"  {'denormalized chat_messages':<34} {legacy_size / 1024 / 1024:>10.1f} MiB")
+        print(f"  {'normalized schema (with indexes)':<34} {os.path.getsize(seeded_path) / 1024 / 1024:>10.1f} MiB")
+
+        close_databases()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark: text_analytics.analyze() vs the original WeeklyReport topic/word functions.
+
+The legacy functions are reproduced verbatim from WeeklyReport before the
+text_analytics module existed: each report ran _extract_most_discussed_topic
+and _extract_word_stats, and each of those joined the whole week into one
+string, ran three re.sub() passes, rebuilt the stop-word set and tokenized.
+
+Usage: python benchmark_text_analytics.py [--sizes 100000 1000000] [--seed N]
+"""
+import argparse
+import random
+import re
+import time
+from collections import Counter
+
+from text_analytics import analyze
+
+VOCABULARY = ("linux kernel bash grep systemd nginx docker podman selinux firewall ansible "
+              "terraform ssh vim emacs lab book question answer server container network "
+              "storage permission user group cron journal package repo build deploy").split()
+FILLER = ("the a and is to of it you that this just like what how yeah lol ok "
+          "so can do not have with for").split()
+NOISE = ["https://example.com/docs/page", "<@123456789012345678>", "!ask", "!joke", "<@!42>"]
+
+
+def _synthetic_week(count, rng):
+    """Chat-like messages: topic words, stop words and the occasional URL/mention/command."""
+    messages = []
+    for _ in range(count):
+        length = rng.randint(3, 30)
+        words = []
+        for _ in range(length):
+            roll = rng.random()
+            if roll < 0.45:
+                words.append(rng.choice(VOCABULARY))
+            elif roll < 0.97:
+                words.append(rng.choice(FILLER))
+            else:
+                words.append(rng.choice(NOISE))
+        messages.append(' '.join(words))
+    return messages
+
+
+def _legacy_extract_most_discussed_topic(messages):
+    if not messages:
+        return "No messages"
+    all_text = ' '.join(messages).lower()
+    all_text = re.sub(r'http[s]?://\S+', '', all_text)
+    all_text = re.sub(r'<@!?\d+>', '', all_text)
+    all_text = re.sub(r'!\w+', '', all_text)
+    stop_words = {
+        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+        'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'been',
+        'be', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+        'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those',
+        'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them',
+        'my', 'your', 'his', 'its', 'our', 'their', 'am', 'im', 'dont', 'doesnt',
+        'not', 'no', 'yes', 'like', 'just', 'get', 'got', 'about', 'so', 'what',
+        'when', 'where', 'who', 'how', 'why', 'if', 'then', 'than', 'some', 'any',
+        'all', 'both', 'each', 'few', 'more', 'most', 'other', 'such', 'only', 'own',
+        'same', 'than', 'too', 'very', 'one', 'two', 'three', 'lol', 'lmao', 'yeah',
+        'ok', 'okay', 'thanks', 'thank', 'thats', 'its', 'youre', 'theyre', 'ive',
+        'haha', 'oh', 'well', 'also', 'now', 'see', 'know', 'think', 'want', 'need'
+    }
+    words = re.findall(r'\b[a-z]{3,}\b', all_text)
+    meaningful_words = [w for w in words if w not in stop_words]
+    if not meaningful_words:
+        return "General discussion"
+    top_words = Counter(meaningful_words).most_common(3)
+    if len(top_words) == 1:
+        return top_words[0][0].capitalize()
+    elif len(top_words) == 2:
+        return f"{top_words[0][0].capitalize()} and {top_words[1][0]}"
+    return f"{top_words[0][0].capitalize()}, {top_words[1][0]}, and {top_words[2][0]}"
+
+
+def _legacy_extract_word_stats(messages):
+    if not messages:
+        return {'words': [], 'bigrams': []}
+    all_text = ' '.join(messages).lower()
+    all_text = re.sub(r'http[s]?://\S+', '', all_text)
+    all_text = re.sub(r'<@!?\d+>', '', all_text)
+    all_text = re.sub(r'!\w+', '', all_text)
+    stop_words = {
+        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+        'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'been',
+        'be', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+        'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those',
+        'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them',
+        'my', 'your', 'his', 'its', 'our', 'their', 'am', 'im', 'dont', 'doesnt',
+        'not', 'no', 'yes', 'like', 'just', 'get', 'got', 'about', 'so', 'what',
+        'when', 'where', 'who', 'how', 'why', 'if', 'then', 'than', 'some', 'any',
+        'all', 'both', 'each', 'few', 'more', 'most', 'other', 'such', 'only', 'own',
+        'same', 'than', 'too', 'very', 'one', 'two', 'three', 'lol', 'lmao', 'yeah',
+        'ok', 'okay', 'thanks', 'thank', 'thats', 'its', 'youre', 'theyre', 'ive',
+        'haha', 'oh', 'well', 'also', 'now', 'see', 'know', 'think', 'want', 'need'
+    }
+    words = re.findall(r'\b[a-z]{3,}\b', all_text)
+    meaningful_words = [w for w in words if w not in stop_words]
+    word_counts = Counter(meaningful_words)
+    bigrams = []
+    for i in range(len(meaningful_words) - 1):
+        bigrams.append(f"{meaningful_words[i]} {meaningful_words[i+1]}")
+    bigram_counts = Counter(bigrams)
+    return {'words': word_counts.most_common(30), 'bigrams': bigram_counts.most_common(20)}
+
+
+def _legacy_report(messages):
+    """What one weekly report cost before: both functions over the same week."""
+    return _legacy_extract_most_discussed_topic(messages), _legacy_extract_word_stats(messages)
+
+
+def _time(fn, messages):
+    start = time.perf_counter()
+    result = fn(messages)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000],
+                        help="synthetic week sizes (messages)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f"{'messages':>10} {'legacy':>10} {'analyze':>10} {'legacy msg/s':>14} {'analyze msg/s':>14} {'speedup':>8}")
+    for size in args.sizes:
+        messages = _synthetic_week(size, rng)
+        legacy_time, (legacy_topic, legacy_stats) = _time(_legacy_report, messages)
+        new_time, result = _time(analyze, messages)
+
+        # Word counts must agree; legacy bigrams also span message boundaries, so they may differ slightly
+        if legacy_stats['words'] != result['words'] or legacy_topic != result['topic']:
+            print(f"  warning: word counts differ for {size} messages")
+
+        print(f"{size:>10,} {legacy_time:>9.2f}s {new_time:>9.2f}s "
+              f"{size / legacy_time:>14,.0f} {size / new_time:>14,.0f} {legacy_time / new_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
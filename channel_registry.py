@@ -0,0 +1,121 @@
+import logging
+from typing import Iterable, Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+class ChannelRegistry:
+    """Per-guild name -> text channel index, so lookups never walk the guild's channels.
+
+    Built when the bot is ready and kept current from the guild and channel
+    create/delete/update events. Names are matched case-insensitively; when
+    several channels share a name, the one highest in the channel list wins,
+    as a linear scan of guild.text_channels would.
+    """
+
+    def __init__(self):
+        self._by_guild: dict[int, dict[str, list[discord.TextChannel]]] = {}
+        self._by_id: dict[int, discord.TextChannel] = {}
+        # Thread id -> parent channel id (None: not a public thread); a thread's parent never changes
+        self._thread_parents: dict[int, Optional[int]] = {}
+
+    def build(self, guilds: Iterable[discord.Guild]) -> None:
+        """(Re)index every text channel of the given guilds."""
+        self._by_guild.clear()
+        self._by_id.clear()
+        for guild in guilds:
+            self.add_guild(guild)
+        logger.info("Channel registry indexed %d channels in %d guilds",
+                    len(self._by_id), len(self._by_guild))
+
+    def add_guild(self, guild: discord.Guild) -> None:
+        self._by_guild.setdefault(guild.id, {})
+        for channel in guild.text_channels:
+            self.add(channel)
+
+    def remove_guild(self, guild: discord.Guild) -> None:
+        for channels in self._by_guild.pop(guild.id, {}).values():
+            for channel in channels:
+                self._by_id.pop(channel.id, None)
+
+    def add(self, channel) -> None:
+        """Index a channel (non-text channels are ignored)."""
+        if not isinstance(channel, discord.TextChannel):
+            return
+        names = self._by_guild.setdefault(channel.guild.id, {})
+        names.setdefault(channel.name.lower(), []).append(channel)
+        self._by_id[channel.id] = channel
+
+    def remove(self, channel) -> None:
+        """Drop a channel from the index.
+
+        `channel` must carry the name it was indexed under: discord.py updates
+        cached channels in place, so on update this is the `before` copy.
+        """
+        if self._by_id.pop(channel.id, None) is None:
+            return
+        names = self._by_guild.get(channel.guild.id, {})
+        key = channel.name.lower()
+        remaining = [c for c in names.get(key, []) if c.id != channel.id]
+        if remaining:
+            names[key] = remaining
+        else:
+            names.pop(key, None)
+
+    def update(self, before, after) -> None:
+        """Re-index a channel after a rename or type change."""
+        self.remove(before)
+        self.add(after)
+
+    def get(self, guild: discord.Guild, name: str) -> Optional[discord.TextChannel]:
+        """Return the text channel called `name` in guild, or None."""
+        channels = self._by_guild.get(guild.id, {}).get(name.lower())
+        if not channels:
+            return None
+        return min(channels, key=lambda c: c.position)
+
+    def find(self, name: str) -> Optional[discord.TextChannel]:
+        """Return the first text channel called `name` in any guild, or None."""
+        for names in self._by_guild.values():
+            channels = names.get(name.lower())
+            if channels:
+                return min(channels, key=lambda c: c.position)
+        return None
+
+    def get_by_id(self, channel_id: int) -> Optional[discord.TextChannel]:
+        return self._by_id.get(channel_id)
+
+    async def can_read(self, member: discord.Member, channel_id: int) -> bool:
+        """Whether member can read a channel of their guild, judging a thread by its parent channel.
+
+        Private threads never count as readable: thread membership is not tracked.
+        """
+        channel = self._by_id.get(channel_id)
+        if channel is None:
+            parent_id = await self._thread_parent(member.guild, channel_id)
+            channel = member.guild.get_channel(parent_id) if parent_id is not None else None
+        if channel is None or channel.guild.id != member.guild.id:
+            return False
+        return channel.permissions_for(member).read_messages
+
+    async def _thread_parent(self, guild: discord.Guild, thread_id: int) -> Optional[int]:
+        """Parent channel id of a public thread in guild, or None. Archived threads are fetched once."""
+        if thread_id in self._thread_parents:
+            return self._thread_parents[thread_id]
+        thread = guild.get_thread(thread_id)
+        if thread is None:
+            try:
+                thread = await guild.fetch_channel(thread_id)
+            except (discord.NotFound, discord.Forbidden):
+                thread = None
+            except discord.HTTPException as e:
+                # Not remembered: the next lookup tries again
+                logger.warning("Could not look up channel %s: %s", thread_id, e)
+                return None
+        parent_id = None
+        if isinstance(thread, discord.Thread) and not thread.is_private():
+            parent_id = thread.parent_id
+        self._thread_parents[thread_id] = parent_id
+        return parent_id
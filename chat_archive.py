@@ -0,0 +1,207 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from config import (
+    CHAT_ARCHIVE_AFTER_DAYS,
+    CHAT_ARCHIVE_BATCH_SIZE,
+    CHAT_ARCHIVE_DIR,
+    CHAT_DB_PATH,
+    INCREMENTAL_VACUUM_PAGES,
+)
+from db import get_database
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS {schema}.messages (
+        id INTEGER PRIMARY KEY,
+        ts INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        content
+    )
+    ''',
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_messages_ts ON messages (ts)",
+]
+
+
+def month_key(ts):
+    """Return the UTC 'YYYY-MM' month an epoch timestamp falls in."""
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m')
+
+
+def month_bounds(month):
+    """Return the [start, end) epoch seconds of a 'YYYY-MM' month."""
+    start = datetime.strptime(month, '%Y-%m').replace(tzinfo=timezone.utc)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+class ChatArchiver:
+    """Moves old messages out of the hot database into monthly archive files.
+
+    Each archive (archive/chat_logs-YYYY-MM.db) holds a messages table with the
+    same columns as the hot one, with content zlib-compressed. User and channel
+    names stay in the hot database. Rollups are only ever added to, so weekly
+    and historical activity counts are unaffected by archiving.
+    """
+
+    def __init__(self, db_path=CHAT_DB_PATH, archive_dir=CHAT_ARCHIVE_DIR,
+                 archive_after_days=CHAT_ARCHIVE_AFTER_DAYS):
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.archive_after_days = archive_after_days
+
+    @property
+    def db(self):
+        # Resolved on use so worker processes can read archives through their own connection
+        return get_database(self.db_path)
+
+    def archive_path(self, month):
+        return os.path.join(self.archive_dir, f"chat_logs-{month}.db")
+
+    def archived_months(self):
+        """Return the sorted 'YYYY-MM' months that have an archive file."""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        months = []
+        for name in os.listdir(self.archive_dir):
+            if name.startswith("chat_logs-") and name.endswith(".db"):
+                months.append(name[len("chat_logs-"):-len(".db")])
+        return sorted(months)
+
+    def archive_old_messages(self, now=None):
+        """Move messages older than the retention age into their monthly archives.
+
+        Work is done in batches of CHAT_ARCHIVE_BATCH_SIZE, each in its own
+        transaction, so the chat log writer is never blocked for long. Copies
+        use INSERT OR IGNORE, making an interrupted run safe to repeat.
+        Returns the number of messages archived.
+        """
+        cutoff = int(now if now is not None else time.time()) - self.archive_after_days * 86400
+        os.makedirs(self.archive_dir, exist_ok=True)
+        archived = 0
+
+        while True:
+            with self.db.write() as conn:
+                oldest = conn.execute("SELECT MIN(ts) FROM messages WHERE ts < ?", (cutoff,)).fetchone()[0]
+                if oldest is None:
+                    break
+                month = month_key(oldest)
+                month_start, month_end = month_bounds(month)
+                upper = min(month_end, cutoff)
+
+                conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path(month),))
+                try:
+                    for statement in ARCHIVE_SCHEMA_SQL:
+                        conn.execute(statement.format(schema="archive"))
+                    with conn:
+                        max_id = conn.execute('''
+                            SELECT MAX(id) FROM (
+                                SELECT id FROM messages WHERE ts >= ? AND ts < ? ORDER BY id LIMIT ?
+                            )
+                        ''', (month_start, upper, CHAT_ARCHIVE_BATCH_SIZE)).fetchone()[0]
+                        conn.execute('''
+                            INSERT OR IGNORE INTO archive.messages (id, ts, user_id, channel_id, content)
+                            SELECT id, ts, user_id, channel_id, zlib_compress(content)
+                            FROM main.messages
+                            WHERE ts >= ? AND ts < ? AND id <= ?
+                        ''', (month_start, upper, max_id))
+                        moved = conn.execute(
+                            "DELETE FROM main.messages WHERE ts >= ? AND ts < ? AND id <= ?",
+                            (month_start, upper, max_id)
+                        ).rowcount
+                finally:
+                    conn.execute("DETACH DATABASE archive")
+            archived += moved
+            logger.debug("Archived %d messages into %s", moved, self.archive_path(month))
+
+        if archived:
+            logger.info("Archived %d messages older than %d days", archived, self.archive_after_days)
+        return archived
+
+    def incremental_vacuum(self, pages=INCREMENTAL_VACUUM_PAGES):
+        """Return up to `pages` free pages to the filesystem. Returns pages freed."""
+        with self.db.write() as conn:
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # executescript steps the pragma to completion; execute() frees one page
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+            after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return before - after
+
+    def run_maintenance(self):
+        """Archive expired messages, then shrink the hot database."""
+        start = time.perf_counter()
+        archived = self.archive_old_messages()
+        freed = self.incremental_vacuum()
+        logger.info("Chat log maintenance: archived %d messages, freed %d pages in %.1fs",
+                    archived, freed, time.perf_counter() - start)
+        return archived, freed
+
+    @contextmanager
+    def attach_month(self, conn, month, alias="archive"):
+        """Attach one month's archive read-only to conn for the duration of the block.
+
+        Yields True if the archive exists (query `{alias}.messages`, wrapping
+        content in zlib_decompress()), or False if there is nothing archived
+        for that month. Connections can only hold a few attached databases,
+        so long ranges should be walked month by month.
+        """
+        path = self.archive_path(month)
+        if not os.path.exists(path):
+            yield False
+            return
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (Path(path).resolve().as_uri() + "?mode=ro",))
+        try:
+            yield True
+        finally:
+            conn.execute(f"DETACH DATABASE {alias}")
+
+    def iter_messages(self, start, end, conn=None, channel_id=None, user_id=None):
+        """Yield (id, ts, user_id, channel_id, content) for start <= ts < end.
+
+        Reads archived months first, then the hot database, so results come
+        out in chronological order regardless of where they are stored.
+        Optionally restricted to one channel and/or one user.
+        """
+        conn = conn or self.db.reader()
+        filters = ''
+        params = [start, end]
+        if channel_id is not None:
+            filters += " AND channel_id = ?"
+            params.append(channel_id)
+        if user_id is not None:
+            filters += " AND user_id = ?"
+            params.append(user_id)
+
+        for month in self.archived_months():
+            month_start, month_end = month_bounds(month)
+            if month_end <= start or month_start >= end:
+                continue
+            with self.attach_month(conn, month) as attached:
+                if not attached:
+                    continue
+                cursor = conn.execute(f'''
+                    SELECT id, ts, user_id, channel_id, zlib_decompress(content)
+                    FROM archive.messages
+                    WHERE ts >= ? AND ts < ?{filters}
+                    ORDER BY ts, id
+                ''', params)
+                try:
+                    yield from cursor
+                finally:
+                    # An open statement would keep the archive locked on DETACH
+                    cursor.close()
+        yield from conn.execute(f'''
+            SELECT id, ts, user_id, channel_id, content
+            FROM messages
+            WHERE ts >= ? AND ts < ?{filters}
+            ORDER BY ts, id
+        ''', params)
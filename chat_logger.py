@@ -1,41 +1,284 @@
 import logging
+import queue
 import sqlite3
-from datetime import datetime, timezone
+import threading
+import time
+from config import (
+    CHAT_DB_PATH,
+    CHAT_LOG_BATCH_SIZE,
+    CHAT_LOG_FLUSH_INTERVAL,
+    CHAT_LOG_NAME_CACHE_SIZE,
+    CHAT_LOG_OVERFLOW_POLICY,
+    CHAT_LOG_QUEUE_SIZE,
+    CHAT_LOG_WRITE_BEHIND,
+    EXCLUDED_CHANNELS_FROM_TOPIC,
+)
+from aggregates import SECONDS_PER_DAY, DailyTermCounts, rebuild_aggregates, update_term_baseline
+from chat_archive import ChatArchiver, month_bounds
+from db import get_database
+from utils import LRUCache
 
 logger = logging.getLogger(__name__)
 
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest")
+
+INSERT_MESSAGE_SQL = '''
+    INSERT INTO messages (ts, user_id, channel_id, content)
+    VALUES (?, ?, ?, ?)
+'''
+
+# Name changes: record history first (only if the name differs from the
+# current one), then upsert the current name.
+INSERT_USER_NAME_SQL = '''
+    INSERT OR IGNORE INTO user_names (user_id, first_seen, username)
+    SELECT ?1, ?2, ?3
+    WHERE NOT EXISTS (SELECT 1 FROM users WHERE user_id = ?1 AND username = ?3)
+'''
+UPSERT_USER_SQL = '''
+    INSERT INTO users (user_id, username) VALUES (?1, ?3)
+    ON CONFLICT (user_id) DO UPDATE SET username = excluded.username
+'''
+INSERT_CHANNEL_NAME_SQL = '''
+    INSERT OR IGNORE INTO channel_names (channel_id, first_seen, channel_name)
+    SELECT ?1, ?2, ?3
+    WHERE NOT EXISTS (SELECT 1 FROM channels WHERE channel_id = ?1 AND channel_name = ?3)
+'''
+UPSERT_CHANNEL_SQL = '''
+    INSERT INTO channels (channel_id, channel_name) VALUES (?1, ?3)
+    ON CONFLICT (channel_id) DO UPDATE SET channel_name = excluded.channel_name
+'''
+
+
+def _name_changes(names):
+    """(id, ts, name) for each name carried in a batch, skipping repeats of the name just before it.
+
+    Until the writer commits a new name, every queued row for that id carries it.
+    """
+    last = {}
+    changes = []
+    for key, ts, name in names:
+        if name is not None and last.get(key) != name:
+            last[key] = name
+            changes.append((key, ts, name))
+    return changes
+
+
 class ChatLogger:
-    def __init__(self, db_path='chat_logs.db'):
+    """Logs chat messages to SQLite.
+
+    In write-behind mode, log_message() only enqueues the row; a background
+    thread drains the queue with executemany() whenever CHAT_LOG_BATCH_SIZE rows
+    are waiting or CHAT_LOG_FLUSH_INTERVAL seconds have passed. close() flushes
+    whatever is left.
+
+    Users and channels are stored once in dimension tables. The last name
+    written for each id is kept in an in-memory LRU, so a name is only written
+    when it is first seen or has changed. The writer updates the LRU once the
+    row carrying a name is committed, so a dropped or failed row never leaves
+    behind a name the database lacks.
+
+    Messages outside EXCLUDED_CHANNELS_FROM_TOPIC are tokenized by the writer
+    thread and added to the daily word and bigram tables in the same
+    transaction, so reports never re-tokenize history.
+    """
+
+    def __init__(self, db_path=CHAT_DB_PATH, write_behind=CHAT_LOG_WRITE_BEHIND,
+                 max_queue=CHAT_LOG_QUEUE_SIZE, batch_size=CHAT_LOG_BATCH_SIZE,
+                 flush_interval=CHAT_LOG_FLUSH_INTERVAL,
+                 overflow_policy=CHAT_LOG_OVERFLOW_POLICY):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}'")
         self.db_path = db_path
-        self._init_db()
-    
-    def _init_db(self):
-        """Initialize the database and create table if it doesn't exist."""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute('''
-                    CREATE TABLE IF NOT EXISTS chat_messages (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        timestamp TEXT NOT NULL,
-                        user_id TEXT NOT NULL,
-                        username TEXT NOT NULL,
-                        channel_id TEXT NOT NULL,
-                        channel_name TEXT NOT NULL,
-                        message_content TEXT NOT NULL
-                    )
-                ''')
-                conn.commit()
-        except sqlite3.Error as e:
-            logger.error("Database initialization error", exc_info=True)
-    
+        self.db = get_database(db_path)
+        self.write_behind = write_behind
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._overflow_policy = overflow_policy
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._writer = None
+        self._user_names = LRUCache(CHAT_LOG_NAME_CACHE_SIZE)
+        self._channel_names = LRUCache(CHAT_LOG_NAME_CACHE_SIZE)
+
+        # Counters exposed through stats()
+        self._enqueued = 0
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
+        self._batches = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+        if self.write_behind:
+            self._writer = threading.Thread(target=self._writer_loop, name="chat-log-writer", daemon=True)
+            self._writer.start()
+
     def log_message(self, user_id, username, channel_id, channel_name, message_content):
         """Log a chat message to the database."""
+        user_id, channel_id = int(user_id), int(channel_id)
+        # Only carry a name along with the row when it is new or changed
+        new_username = username if self._user_names.get(user_id) != username else None
+        new_channel_name = channel_name if self._channel_names.get(channel_id) != channel_name else None
+        for_topics = channel_name not in EXCLUDED_CHANNELS_FROM_TOPIC
+        row = (int(time.time()), user_id, channel_id, message_content, new_username, new_channel_name, for_topics)
+
+        if not self.write_behind:
+            self._write_batch([row])
+            return
+
+        if self._stop.is_set():
+            logger.warning("Chat logger is closed, dropping message from user=%s channel=%s", username, channel_name)
+            self._dropped += 1
+            return
+
+        self._enqueue(row)
+
+    def _enqueue(self, row):
+        """Put a row on the write-behind queue, applying the overflow policy if it is full."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute('''
-                    INSERT INTO chat_messages (timestamp, user_id, username, channel_id, channel_name, message_content)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (datetime.now(timezone.utc).isoformat(), str(user_id), username, str(channel_id), channel_name, message_content))
-                conn.commit()
+            self._queue.put_nowait(row)
+            self._enqueued += 1
+            return
+        except queue.Full:
+            pass
+
+        # No blocking policy: this runs on the event loop, which must never wait on the writer
+        if self._overflow_policy == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self._dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(row)
+                self._enqueued += 1
+                return
+            except queue.Full:
+                pass
+
+        self._dropped += 1
+        logger.warning("Chat log queue full (%d), dropped message from user_id=%s channel_id=%s",
+                       self._queue.maxsize, row[1], row[2])
+
+    def _collect_batch(self):
+        """Block until a batch is ready: batch_size rows queued or flush_interval elapsed."""
+        try:
+            first = self._queue.get(timeout=self._flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self._flush_interval
+        while len(batch) < self._batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if self._stop.is_set() or remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _writer_loop(self):
+        """Background thread: drain the queue into SQLite until closed and empty."""
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect_batch()
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        """Insert a batch of rows in one transaction and record flush latency."""
+        start = time.perf_counter()
+        users = _name_changes((r[1], r[0], r[4]) for r in batch)
+        channels = _name_changes((r[2], r[0], r[5]) for r in batch)
+        term_counts = DailyTermCounts()
+        for r in batch:
+            if r[6]:
+                term_counts.add(r[0], r[3])
+        try:
+            with self.db.write() as conn, conn:
+                if users:
+                    conn.executemany(INSERT_USER_NAME_SQL, users)
+                    conn.executemany(UPSERT_USER_SQL, users)
+                if channels:
+                    conn.executemany(INSERT_CHANNEL_NAME_SQL, channels)
+                    conn.executemany(UPSERT_CHANNEL_SQL, channels)
+                conn.executemany(INSERT_MESSAGE_SQL, [r[:4] for r in batch])
+                term_counts.write(conn)
+            self._written += len(batch)
+            # Only committed names count as known; later rows stop carrying them
+            for user_id, _, username in users:
+                self._user_names.put(user_id, username)
+            for channel_id, _, channel_name in channels:
+                self._channel_names.put(channel_id, channel_name)
         except sqlite3.Error as e:
-            logger.error("Failed to log message for user=%s channel=%s", username, channel_name, exc_info=True)
+            self._failed += len(batch)
+            logger.error("Failed to write batch of %d chat messages", len(batch), exc_info=True)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._batches += 1
+        self._last_flush_ms = elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+    def rebuild_rollups(self, archiver=None, now=None):
+        """Backfill the activity rollups and daily term counts from the existing chat history.
+
+        These are normally maintained as messages are written; this is only
+        needed to repair them. Archived months are read through `archiver`,
+        so their rollups survive. Returns the number of messages counted.
+        """
+        archiver = archiver or ChatArchiver(self.db_path)
+        start = time.perf_counter()
+        now = int(now if now is not None else time.time())
+        first_ts, last_ts = self.db.reader().execute("SELECT MIN(ts), MAX(ts) FROM messages").fetchone()
+        starts = [first_ts if first_ts is not None else now]
+        months = archiver.archived_months()
+        if months:
+            starts.append(month_bounds(months[0])[0])
+        first_day = min(starts) // SECONDS_PER_DAY
+        last_day = max(last_ts or 0, now) // SECONDS_PER_DAY
+
+        total = rebuild_aggregates(
+            self.db, lambda start, end, conn: archiver.iter_messages(start, end, conn=conn), first_day, last_day
+        )
+        logger.info("Rebuilt activity rollups and daily term counts for %d messages in %.1fs",
+                    total, time.perf_counter() - start)
+        return total
+
+    def update_term_baseline(self):
+        """Slide the topic document-frequency baseline forward to yesterday (run nightly)."""
+        with self.db.write() as conn, conn:
+            added, removed = update_term_baseline(conn)
+        logger.info("Topic baseline updated: %d days added, %d expired", added, removed)
+        return added, removed
+
+    def stats(self):
+        """Return queue depth and flush latency counters."""
+        return {
+            'write_behind': self.write_behind,
+            'queue_depth': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'enqueued': self._enqueued,
+            'written': self._written,
+            'dropped': self._dropped,
+            'failed': self._failed,
+            'batches': self._batches,
+            'last_flush_ms': self._last_flush_ms,
+            'avg_flush_ms': self._total_flush_ms / self._batches if self._batches else 0.0,
+            'max_flush_ms': self._max_flush_ms,
+        }
+
+    def close(self, timeout=None):
+        """Stop accepting messages and flush everything still queued."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        if self._writer:
+            self._writer.join(timeout)
+            if self._writer.is_alive():
+                logger.error("Chat log writer did not finish flushing (%d messages queued)", self._queue.qsize())
+            else:
+                logger.info("Chat log flushed: %d written, %d dropped, %d failed",
+                            self._written, self._dropped, self._failed)
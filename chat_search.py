@@ -0,0 +1,105 @@
+import logging
+import re
+import time
+from config import CHAT_DB_PATH, SEARCH_MAX_RESULTS
+from db import get_database
+
+logger = logging.getLogger(__name__)
+
+# A search term is either a "quoted phrase" or a bare word (optionally ending in * for prefix search)
+_TERM_RE = re.compile(r'"([^"]+)"|(\S+)')
+
+
+def build_match_query(terms):
+    """Turn user-supplied search terms into a safe FTS5 MATCH expression.
+
+    Every term is quoted so FTS5 operators and punctuation in user input are
+    treated as plain text; all terms must match. A trailing * on a bare word
+    is kept as a prefix search.
+    """
+    parts = []
+    for phrase, word in _TERM_RE.findall(terms):
+        text = phrase or word
+        prefix = bool(word) and text.endswith('*') and len(text) > 1
+        text = text.rstrip('*') if prefix else text
+        text = text.replace('"', '""').strip()
+        if text:
+            parts.append(f'"{text}"' + ('*' if prefix else ''))
+    return ' '.join(parts)
+
+
+class ChatSearch:
+    """Full-text search over logged chat using the messages_fts index.
+
+    Archived messages are removed from the index along with the hot rows, so
+    search covers the retention window (CHAT_ARCHIVE_AFTER_DAYS).
+    """
+
+    def __init__(self, db_path=CHAT_DB_PATH):
+        self.db = get_database(db_path)
+
+    def search(self, terms, channel_id=None, channel_name=None, since=None, until=None,
+               limit=SEARCH_MAX_RESULTS, channel_ids=None):
+        """Return up to `limit` messages matching terms, best match first.
+
+        since/until are epoch seconds. channel_ids, when given, restricts
+        results to those channels (e.g. the ones the requester can read).
+        Each result is a dict with id, ts, username, channel_name and a
+        highlighted snippet.
+        """
+        match = build_match_query(terms)
+        if not match or (channel_ids is not None and not channel_ids):
+            return []
+
+        filters = []
+        params = [match]
+        if channel_id is not None:
+            filters.append("m.channel_id = ?")
+            params.append(int(channel_id))
+        if channel_name is not None:
+            filters.append("c.channel_name = ? COLLATE NOCASE")
+            params.append(channel_name)
+        if channel_ids is not None:
+            filters.append(f"m.channel_id IN ({','.join('?' * len(channel_ids))})")
+            params.extend(int(cid) for cid in channel_ids)
+        if since is not None:
+            filters.append("m.ts >= ?")
+            params.append(int(since))
+        if until is not None:
+            filters.append("m.ts < ?")
+            params.append(int(until))
+        where = ''.join(f" AND {f}" for f in filters)
+        params.append(limit)
+
+        start = time.perf_counter()
+        rows = self.db.reader().execute(f'''
+            SELECT m.id, m.ts, u.username, c.channel_name,
+                   snippet(messages_fts, 0, '**', '**', '...', 16)
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            LEFT JOIN users u ON u.user_id = m.user_id
+            LEFT JOIN channels c ON c.channel_id = m.channel_id
+            WHERE messages_fts MATCH ?{where}
+            ORDER BY rank
+            LIMIT ?
+        ''', params).fetchall()
+        logger.debug("Search %r returned %d results in %.1f ms", match, len(rows),
+                     (time.perf_counter() - start) * 1000)
+
+        return [
+            {'id': row[0], 'ts': row[1], 'username': row[2], 'channel_name': row[3], 'snippet': row[4]}
+            for row in rows
+        ]
+
+    def channel_ids(self):
+        """Ids of every channel with logged messages (threads included)."""
+        return [row[0] for row in self.db.reader().execute("SELECT channel_id FROM channels")]
+
+    def rebuild_index(self):
+        """Rebuild the full-text index from the messages table. Returns rows indexed."""
+        start = time.perf_counter()
+        with self.db.write() as conn, conn:
+            conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+            total = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        logger.info("Rebuilt search index for %d messages in %.1fs", total, time.perf_counter() - start)
+        return total
@@ -0,0 +1,98 @@
+import logging
+import time
+from typing import Optional
+
+from config import CIRCUIT_BREAKERS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """Stops calling an upstream that keeps failing.
+
+    Closed: calls go through. `failure_threshold` consecutive failures (a call
+    slower than `slow_call_seconds` counts as one) open the breaker. Open:
+    calls are refused so callers can answer locally at once. After
+    `reset_timeout` seconds the breaker half-opens and lets a single probe
+    through; its success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, slow_call_seconds: float, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.short_circuited = 0
+        self.opens = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now. A refused call is counted as short-circuited."""
+        now = time.monotonic()
+        if self.state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probe_started = None
+            logger.info("Circuit breaker %s half-open, probing", self.name)
+        if self.state == HALF_OPEN:
+            # One probe at a time; a probe that never reported back (cancelled) expires
+            if self._probe_started is None or now - self._probe_started >= self.reset_timeout:
+                self._probe_started = now
+                self.calls += 1
+                return True
+        elif self.state == CLOSED:
+            self.calls += 1
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record(self, ok: bool, elapsed: float) -> None:
+        """Report the outcome of an allowed call."""
+        if ok and elapsed > self.slow_call_seconds:
+            self.slow_calls += 1
+            ok = False
+        if ok:
+            if self.state != CLOSED:
+                logger.info("Circuit breaker %s closed", self.name)
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            return
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self.state = OPEN
+            self._opened_at = time.monotonic()
+            self.opens += 1
+            logger.warning("Circuit breaker %s opened after %d consecutive failures",
+                           self.name, self.consecutive_failures)
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker half-opens (0 when not open)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'calls': self.calls,
+            'failures': self.failures,
+            'slow_calls': self.slow_calls,
+            'short_circuited': self.short_circuited,
+            'opens': self.opens,
+            'retry_in': self.retry_in(),
+        }
+
+
+def build_breakers(settings=CIRCUIT_BREAKERS):
+    return {name: CircuitBreaker(name, **options) for name, options in settings.items()}
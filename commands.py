@@ -6,11 +6,23 @@ import re
 import base64
 import asyncio
 import shlex
-from datetime import datetime, timezone
+import sqlite3
+from datetime import datetime, timedelta, timezone
 from typing import Optional
-from api_client import APIClient
+from api_client import APIClient, StreamInterrupted
+from circuit_breaker import OPEN
+from channel_registry import ChannelRegistry
+from chat_search import ChatSearch
+from response_cache import ResponseCache
 from utils import increment_count, get_bot_stats, parse_command_args
-from config import WELCOME_CHANNEL_ID, AUTHORIZED_USERS
+from config import (
+    AUTHORIZED_USERS,
+    DISCORD_MESSAGE_LIMIT,
+    REPORT_MAX_DAYS,
+    STREAM_LLM_RESPONSES,
+    WELCOME_CHANNEL_ID,
+)
+from message_stream import StreamingReply, split_point
 
 logger = logging.getLogger(__name__)
 
@@ -75,9 +87,96 @@ async def _run_ssh_command(cmd: str, input_data: str = None) -> tuple:
     return proc.returncode, stdout.decode(), stderr.decode()
 
 
+def _parse_search_args(args: str) -> tuple:
+    """Split !search arguments into (terms, channel_id, channel_name, since, until).
+
+    Supported filters: in:#channel (a channel mention or a name),
+    after:YYYY-MM-DD and before:YYYY-MM-DD (UTC, before is exclusive).
+    Raises ValueError on a malformed date.
+    """
+    terms = []
+    channel_id = channel_name = since = until = None
+    for token in args.split():
+        lowered = token.lower()
+        if lowered.startswith("in:") and len(token) > 3:
+            target = token[3:]
+            mention = re.fullmatch(r'<#(\d+)>', target)
+            if mention:
+                channel_id = int(mention.group(1))
+            else:
+                channel_name = target.lstrip('#')
+        elif re.fullmatch(r'<#\d+>', token):
+            channel_id = int(token[2:-1])
+        elif lowered.startswith("after:"):
+            since = datetime.strptime(token[6:], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        elif lowered.startswith("before:"):
+            until = datetime.strptime(token[7:], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        else:
+            terms.append(token)
+    return (
+        ' '.join(terms),
+        channel_id,
+        channel_name,
+        int(since.timestamp()) if since else None,
+        int(until.timestamp()) if until else None,
+    )
+
+
+def parse_report_args(args: str, now: Optional[datetime] = None) -> tuple:
+    """Split !report arguments into (label, start, end, channel_id, user_id).
+
+    The window is a duration ending now (24h, 7d, 30d, ...; default 7d) or an
+    inclusive UTC date range YYYY-MM-DD..YYYY-MM-DD (end is then exclusive
+    epoch seconds, otherwise None). Relative windows start on an hour
+    boundary, so repeating a query within the hour reuses the cached result.
+    The optional scope is a #channel and/or @user mention.
+    Raises ValueError on malformed input or a window over REPORT_MAX_DAYS.
+    """
+    now = now or datetime.now(timezone.utc)
+    label = "Last 7 Days"
+    duration = timedelta(days=7)
+    start = end = None
+    channel_id = user_id = None
+
+    for token in args.split():
+        relative = re.fullmatch(r'(\d+)([hd])', token.lower())
+        date_range = re.fullmatch(r'(\d{4}-\d{2}-\d{2})\.\.(\d{4}-\d{2}-\d{2})', token)
+        if relative:
+            amount = int(relative.group(1))
+            unit = "Hours" if relative.group(2) == 'h' else "Days"
+            duration = timedelta(hours=amount) if unit == "Hours" else timedelta(days=amount)
+            label = f"Last {amount} {unit}"
+            start = end = None
+        elif date_range:
+            first = datetime.strptime(date_range.group(1), "%Y-%m-%d").replace(tzinfo=timezone.utc)
+            last = datetime.strptime(date_range.group(2), "%Y-%m-%d").replace(tzinfo=timezone.utc)
+            if last < first:
+                raise ValueError("date range ends before it starts")
+            start, end = first, last + timedelta(days=1)
+            duration = end - start
+            label = f"{date_range.group(1)} to {date_range.group(2)}"
+        elif re.fullmatch(r'<#\d+>', token):
+            channel_id = int(token[2:-1])
+        elif re.fullmatch(r'<@!?\d+>', token):
+            user_id = int(token.strip('<@!>'))
+        else:
+            raise ValueError(f"unrecognized argument {token!r}")
+
+    if duration <= timedelta(0) or duration > timedelta(days=REPORT_MAX_DAYS):
+        raise ValueError(f"window must be between 1 hour and {REPORT_MAX_DAYS} days")
+    if start is None:
+        start_ts = int((now - duration).timestamp()) // 3600 * 3600
+        return label, start_ts, None, channel_id, user_id
+    return label, int(start.timestamp()), int(end.timestamp()), channel_id, user_id
+
+
 class BotCommands:
-    def __init__(self, api_client: APIClient):
+    def __init__(self, api_client: APIClient, chat_search: Optional[ChatSearch] = None,
+                 response_cache: Optional[ResponseCache] = None, channels: Optional[ChannelRegistry] = None):
         self.api_client = api_client
+        self.chat_search = chat_search
+        self.response_cache = response_cache
+        self.channels = channels
 
     async def handle_ask_command(self, message: discord.Message) -> None:
         """Handle !ask command."""
@@ -92,16 +191,24 @@ class BotCommands:
             {"role": "user", "content": question}
         ]
 
-        response = await self.api_client.make_groq_request(messages)
+        # Common questions are answered from the cache without an API call
+        response = cache_key = None
+        if self.response_cache:
+            cache_key = self.response_cache.make_key(self.api_client.profiles['ask'].model, system_prompt, question)
+            response = await asyncio.to_thread(self.response_cache.get, cache_key)
+        if response is not None:
+            await self._send_long(message.channel, response)
+        else:
+            info = {}
+            response = await self._reply_with_llm(message.channel, messages, profile="ask", info=info)
+            # The key names the primary model; a hedged answer from the backup model is not cached under it
+            if response and cache_key and info.get('model') == self.api_client.profiles['ask'].model:
+                await asyncio.to_thread(self.response_cache.put, cache_key, question, response)
+
         if response:
-            if len(response) > 2000:
-                await message.channel.send(response[:2000])
-                await message.channel.send(response[2000:])
-            else:
-                await message.channel.send(response)
             increment_count("ask")
         else:
-            await message.channel.send("Sorry, I encountered an error processing your request.")
+            await message.channel.send(self._llm_error_message())
 
     async def handle_chat_command(self, message: discord.Message) -> None:
         """Handle !chat command."""
@@ -116,15 +223,94 @@ class BotCommands:
             {"role": "user", "content": chat_text}
         ]
 
-        response = await self.api_client.make_groq_request(messages)
+        response = await self._reply_with_llm(message.channel, messages, profile="chat")
+        if not response:
+            await message.channel.send(self._llm_error_message())
+
+    async def _reply_with_llm(self, channel, messages: list, profile: str,
+                              info: Optional[dict] = None) -> Optional[str]:
+        """Answer in channel with a Groq completion for a request profile, streamed when enabled.
+
+        Returns the full response, or None if the request failed (a streamed
+        answer may then have been partly shown). `info` is passed on to the
+        API client, which records the model that answered.
+        """
+        if STREAM_LLM_RESPONSES:
+            reply = StreamingReply(channel)
+            try:
+                response = await reply.consume(self.api_client.stream_groq_request(messages, profile=profile, info=info))
+            except StreamInterrupted:
+                await reply.finish()
+                return None
+            return response or None
+
+        response = await self.api_client.make_groq_request(messages, profile=profile, info=info)
         if response:
-            if len(response) > 2000:
-                await message.channel.send(response[:2000])
-                await message.channel.send(response[2000:])
-            else:
-                await message.channel.send(response)
-        else:
-            await message.channel.send("Sorry, I encountered an error processing your request.")
+            await self._send_long(channel, response)
+        return response
+
+    def _llm_error_message(self) -> str:
+        breaker = self.api_client.breakers["groq"]
+        if breaker.state == OPEN:
+            # Canned reply while the LLM backend is known to be down
+            return (f"*sips cold coffee* The AI backend is down and I'm not waiting on it. "
+                    f"Try again in {max(1, round(breaker.retry_in() / 60))} minute(s), or read the man page.")
+        return "Sorry, I encountered an error processing your request."
+
+    async def _send_long(self, channel, text: str) -> None:
+        """Send text, split across as many messages as the length limit requires."""
+        while text:
+            cut = split_point(text, DISCORD_MESSAGE_LIMIT) if len(text) > DISCORD_MESSAGE_LIMIT else len(text)
+            await channel.send(text[:cut])
+            text = text[cut:]
+
+    async def handle_search_command(self, message: discord.Message) -> None:
+        """Handle !search command: full-text search over logged chat."""
+        args = parse_command_args(message.content, "!search")
+        if not args or not self.chat_search:
+            await message.channel.send("Usage: !search <terms> [in:#channel] [after:YYYY-MM-DD] [before:YYYY-MM-DD]")
+            return
+
+        try:
+            terms, channel_id, channel_name, since, until = _parse_search_args(args)
+        except ValueError:
+            await message.channel.send("Dates must look like YYYY-MM-DD.")
+            return
+        if not terms:
+            await message.channel.send("Please provide something to search for.")
+            return
+        if message.guild is None or self.channels is None:
+            await message.channel.send("!search only works in a server channel.")
+            return
+
+        try:
+            # Only search channels (and threads of channels) the requester can read
+            logged = await asyncio.to_thread(self.chat_search.channel_ids)
+            readable = [cid for cid in logged if await self.channels.can_read(message.author, cid)]
+            results = await asyncio.to_thread(
+                self.chat_search.search, terms,
+                channel_id=channel_id, channel_name=channel_name, since=since, until=until,
+                channel_ids=readable
+            )
+        except sqlite3.Error:
+            logger.error("Search failed for %r", terms, exc_info=True)
+            await message.channel.send("Sorry, the search failed.")
+            return
+
+        if not results:
+            await message.channel.send(f"No messages found for: {terms}", allowed_mentions=discord.AllowedMentions.none())
+            return
+
+        lines = [f"**Search results for:** {terms}"]
+        for result in results:
+            date = datetime.fromtimestamp(result['ts'], timezone.utc).strftime("%Y-%m-%d")
+            snippet = result['snippet'].replace('\n', ' ')
+            lines.append(f"#{result['channel_name']} | {result['username']} | {date}\n> {snippet}")
+        # Drop whole results rather than cut one (and its markdown) in half
+        while len(lines) > 2 and len('\n'.join(lines)) > DISCORD_MESSAGE_LIMIT:
+            lines.pop()
+        # Snippets are logged text: never let them ping anyone again
+        await message.channel.send('\n'.join(lines), allowed_mentions=discord.AllowedMentions.none())
 
     async def handle_simple_commands(self, message: discord.Message) -> None:
         """Handle simple commands that don't require complex logic."""
@@ -165,7 +351,7 @@ class BotCommands:
             await message.channel.send("Check out Scoot Tanis's new Book of Labs here! -> https://leanpub.com/theprolugbigbookoflabs")
 
         elif content == "!commands":
-            await message.channel.send('I currently support: !ask, !chat, !labs, !book, !8ball, !roll, !coinflip, !server_age, !user_count, !commands, !joke, !bot_stats, !addkey, !removekey, !keystatus, and some other nonsense.')
+            await message.channel.send('I currently support: !ask, !chat, !labs, !book, !8ball, !roll, !coinflip, !server_age, !user_count, !commands, !joke, !bot_stats, !search, !addkey, !removekey, !keystatus, and some other nonsense.')
 
         elif content == "!joke":
             joke = await self.api_client.get_joke()
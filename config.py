@@ -59,6 +59,67 @@ PERPLEXITY_URL = "https://api.perplexity.ai/chat/completions"
 JOKE_API_URL = "https://icanhazdadjoke.com/"
 EIGHTBALL_API_URL = "https://eightballapi.com/api"
 
+# HTTP connection pools (one keep-alive pool per API host)
+HTTP_DNS_CACHE_TTL = 300               # Seconds resolved addresses are reused
+HTTP_KEEPALIVE_TIMEOUT = 75            # Seconds an idle connection is kept open for reuse
+HTTP_CONNECT_TIMEOUT = 5               # Seconds allowed for DNS + TCP + TLS on a new connection
+HTTP_ENDPOINTS = {
+    # name: base URL, max concurrent connections to the host, total request timeout (seconds)
+    "groq": {"url": GROQ_URL, "limit": 10, "timeout": 30},
+    "perplexity": {"url": PERPLEXITY_URL, "limit": 4, "timeout": 60},
+    "joke": {"url": JOKE_API_URL, "limit": 2, "timeout": 10},
+    "eightball": {"url": EIGHTBALL_API_URL, "limit": 2, "timeout": 10},
+}
+
+# LLM request scheduling (one scheduler per LLM provider)
+LLM_LIMITS = {
+    # name: sustained requests/second, burst size, max requests in flight
+    "groq": {"rate": 0.5, "burst": 5, "concurrency": 4},
+    "perplexity": {"rate": 0.2, "burst": 2, "concurrency": 2},
+}
+LLM_MAX_RETRIES = 3                    # Retries after a 429, 5xx or connection error
+LLM_BACKOFF_BASE = 1.0                 # Seconds before the first retry, doubled per attempt
+LLM_BACKOFF_MAX = 30.0                 # Cap on a single backoff (and on an honoured Retry-After)
+LLM_QUEUE_WAIT_BUCKETS = (0.1, 0.5, 1, 2, 5, 15, 60)  # Queue-wait histogram bucket bounds (seconds)
+
+# LLM request profiles, one per call site
+LLM_PROFILES = {
+    # name: model, completion token cap (includes reasoning tokens), reasoning effort,
+    # seconds before a non-streamed request gives up, faster model to hedge with (None: never hedge)
+    "ask": {"model": "openai/gpt-oss-120b", "max_tokens": 4096, "reasoning_effort": "medium",
+            "deadline": 90, "hedge_model": "openai/gpt-oss-20b"},
+    "chat": {"model": "openai/gpt-oss-120b", "max_tokens": 2048, "reasoning_effort": "low",
+             "deadline": 60, "hedge_model": "openai/gpt-oss-20b"},
+    "report_topic": {"model": "openai/gpt-oss-20b", "max_tokens": 1024, "reasoning_effort": "low",
+                     "deadline": 60, "hedge_model": None},
+    "welcome": {"model": "openai/gpt-oss-20b", "max_tokens": 1024, "reasoning_effort": "low",
+                "deadline": 30, "hedge_model": None},
+}
+LLM_HEDGE_MIN_SAMPLES = 20             # Latency samples a profile needs before it hedges at its p95
+LLM_LATENCY_WINDOW = 200               # Recent latencies kept per profile for percentiles
+LLM_MODEL_PRICES = {
+    # model: USD per million (input, output) tokens
+    "openai/gpt-oss-120b": (0.15, 0.60),
+    "openai/gpt-oss-20b": (0.075, 0.30),
+}
+
+# Circuit breakers (one per external API)
+CIRCUIT_BREAKERS = {
+    # name: consecutive failures that open it, seconds after which a call counts as failed (slow),
+    # seconds an open breaker waits before letting a probe through
+    "groq": {"failure_threshold": 5, "slow_call_seconds": 45, "reset_timeout": 60},
+    "perplexity": {"failure_threshold": 5, "slow_call_seconds": 60, "reset_timeout": 60},
+    "joke": {"failure_threshold": 3, "slow_call_seconds": 5, "reset_timeout": 120},
+    "eightball": {"failure_threshold": 3, "slow_call_seconds": 5, "reset_timeout": 120},
+}
+JOKE_CACHE_SIZE = 50                   # Recent jokes kept to tell while the joke API is unavailable
+
+# Welcome messages
+WELCOME_POOL_SIZE = 12                 # Pre-generated welcome templates kept ready
+WELCOME_REFILL_RETRY = 60              # Seconds before retrying a failed template generation
+WELCOME_BATCH_WINDOW = 10.0            # Joins within this many seconds of a welcome share the next one
+WELCOME_BATCH_MAX = 25                 # Max members mentioned in one welcome message
+
 # Channel names to exclude from weekly report topic detection
 EXCLUDED_CHANNELS_FROM_TOPIC = {'sandbox', 'moderator-only', 'course-discussion-posts'}
 
@@ -66,4 +127,54 @@ EXCLUDED_CHANNELS_FROM_TOPIC = {'sandbox', 'moderator-only', 'course-discussion-
 SPAM_CHANNEL_THRESHOLD = 3       # Distinct channels within the window that triggers detection
 SPAM_TIME_WINDOW_SECONDS = 10    # Sliding window in seconds
 SPAM_TIMEOUT_MINUTES = 10        # Timeout duration applied to spammers
-SPAM_NOTIFY_CHANNEL = "moderator-only"  # Channel to post spam notifications
\ No newline at end of file
+SPAM_NOTIFY_CHANNEL = "moderator-only"  # Channel to post spam notifications
+
+# Chat logging (write-behind queue)
+CHAT_LOG_WRITE_BEHIND = True           # Queue messages and write them from a background thread
+CHAT_LOG_QUEUE_SIZE = 10000            # Max messages buffered in memory
+CHAT_LOG_BATCH_SIZE = 200              # Flush once this many messages are queued
+CHAT_LOG_FLUSH_INTERVAL = 2.0          # Flush at least this often (seconds)
+CHAT_LOG_OVERFLOW_POLICY = "drop_oldest"  # "drop_oldest" or "drop_newest" when the queue is full
+
+# SQLite storage
+CHAT_DB_PATH = "chat_logs.db"
+DB_SYNCHRONOUS = "NORMAL"              # Safe with WAL; only the last transactions can be lost on power failure
+DB_CACHE_SIZE_KB = 20000               # Page cache per connection
+DB_MMAP_SIZE = 256 * 1024 * 1024       # Memory-mapped I/O window
+DB_BUSY_TIMEOUT_MS = 5000              # Wait this long for a lock before failing
+DB_STATEMENT_CACHE_SIZE = 256          # Prepared statements kept per connection
+CHAT_LOG_NAME_CACHE_SIZE = 5000        # User/channel names remembered to skip dimension writes
+
+# Chat log retention
+CHAT_ARCHIVE_AFTER_DAYS = 90           # Messages older than this move to monthly archive files
+CHAT_ARCHIVE_DIR = "archive"           # Directory holding chat_logs-YYYY-MM.db archive files
+CHAT_ARCHIVE_BATCH_SIZE = 5000         # Messages moved per transaction (the write lock is released between batches)
+INCREMENTAL_VACUUM_PAGES = 5000        # Free pages returned to the OS per maintenance run
+
+# Streamed LLM replies (!ask, !chat)
+STREAM_LLM_RESPONSES = True            # Show answers while they are generated instead of all at once
+STREAM_EDIT_INTERVAL = 1.0             # Min seconds between edits of a streamed message (Discord rate limits edits)
+DISCORD_MESSAGE_LIMIT = 2000           # Max characters per Discord message
+
+# !ask response cache
+ASK_CACHE_MEMORY_SIZE = 256            # Answers kept in memory in front of the SQLite tier
+ASK_CACHE_TTL_SECONDS = 7 * 86400      # Cached answers expire after this long
+
+# Chat search
+SEARCH_MAX_RESULTS = 5                 # Results shown by !search
+
+# Weekly report
+REPORT_FETCH_SIZE = 1000               # Messages fetched per cursor chunk when streaming message history
+REPORT_TIMEOUT_SECONDS = 120           # Cancel a report computation that runs longer than this
+WEEKLY_REPORT_PREWARM_MINUTES = 30     # Compute the Sunday report (and AI topic) this long before it is posted
+REPORT_CACHE_SIZE = 64                 # Report results kept in the LRU cache (per window, scope and watermark)
+REPORT_MAX_DAYS = 366                  # Longest window !report accepts
+REPORT_APPROXIMATE_AFTER_DAYS = 31     # Windows longer than this use approximate (sketch) term stats
+TOPIC_BASELINE_DAYS = 90               # Days in the rolling document-frequency baseline used to score topics
+TOPIC_CANDIDATES = 200                 # Most frequent words re-ranked by TF-IDF against the baseline
+TERM_SKETCH_CAPACITY = 2000            # Terms tracked per heavy-hitter sketch in approximate term stats
+
+# Historical (full-history) reports
+HISTORY_WORKERS = 4                    # Worker processes scanning month shards in parallel
+HISTORY_SKETCH_CAPACITY = 20000        # Words/bigrams kept per shard (Space-Saving) when merging
+HISTORY_CHECKPOINT_PATH = "history_checkpoint.db"  # Finished shard results, reused by later runs
@@ -0,0 +1,131 @@
+import logging
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from config import (
+    CHAT_DB_PATH,
+    DB_BUSY_TIMEOUT_MS,
+    DB_CACHE_SIZE_KB,
+    DB_MMAP_SIZE,
+    DB_STATEMENT_CACHE_SIZE,
+    DB_SYNCHRONOUS,
+)
+from migrations import apply_migrations
+
+logger = logging.getLogger(__name__)
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def _zlib_compress(text):
+    """SQL function: compress text to a BLOB, or keep it as-is when that is smaller."""
+    if text is None:
+        return None
+    data = zlib.compress(text.encode('utf-8'))
+    return data if len(data) < len(text.encode('utf-8')) else text
+
+
+def _zlib_decompress(value):
+    """SQL function: inverse of zlib_compress()."""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+def connect(db_path=CHAT_DB_PATH, read_only=False):
+    """Open a connection with the tuned pragmas and SQL functions applied.
+
+    Does not apply migrations; use get_database() for the shared, migrated
+    connections. Read-only connections suit worker processes.
+    """
+    # Always a URI connection: only those accept the read-only file: URIs that
+    # ChatArchiver.attach_month ATTACHes, whatever SQLITE_USE_URI was built as
+    uri = Path(db_path).resolve().as_uri() + ("?mode=ro" if read_only else "")
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                           cached_statements=DB_STATEMENT_CACHE_SIZE)
+    conn.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size=-{int(DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(DB_MMAP_SIZE)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.create_function("zlib_compress", 1, _zlib_compress, deterministic=True)
+    conn.create_function("zlib_decompress", 1, _zlib_decompress, deterministic=True)
+    if read_only:
+        conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+class Database:
+    """Long-lived, tuned SQLite connections for one database file.
+
+    There is a single write connection, serialized by a lock so it can be used
+    from the chat log writer thread and the event loop alike, and one read-only
+    connection per thread for analytics. The database runs in WAL mode so
+    report queries never block log writes, and pending schema migrations are
+    applied when it is opened.
+    """
+
+    def __init__(self, db_path=CHAT_DB_PATH):
+        self.db_path = db_path
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._write_conn = connect(self.db_path)
+        self._write_conn.execute("PRAGMA journal_mode=WAL")
+        self.schema_version = apply_migrations(self._write_conn)
+
+    @contextmanager
+    def write(self):
+        """Yield the shared write connection while holding the write lock.
+
+        Use the connection as a context manager (``with conn:``) to commit.
+        """
+        with self._write_lock:
+            yield self._write_conn
+
+    def reader(self):
+        """Return this thread's read-only connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.db_path, read_only=True)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def close(self):
+        """Close every connection held by this database."""
+        with self._readers_lock:
+            for conn in self._readers:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    logger.warning("Error closing read connection for %s", self.db_path, exc_info=True)
+            self._readers.clear()
+        with self._write_lock:
+            try:
+                self._write_conn.close()
+            except sqlite3.Error:
+                logger.warning("Error closing write connection for %s", self.db_path, exc_info=True)
+
+
+def get_database(db_path=CHAT_DB_PATH):
+    """Return the shared Database for db_path, opening it on first use."""
+    with _databases_lock:
+        db = _databases.get(db_path)
+        if db is None:
+            db = Database(db_path)
+            _databases[db_path] = db
+        return db
+
+
+def close_databases():
+    """Close all shared databases (called on shutdown)."""
+    with _databases_lock:
+        for db in _databases.values():
+            db.close()
+        _databases.clear()
@@ -2,27 +2,47 @@ import discord
 from discord.ext import commands, tasks
 import asyncio
 import logging
-from datetime import datetime, time
+import sqlite3
+from datetime import datetime, time, timedelta
 import pytz
 
 # Local imports
-from config import Config, WELCOME_CHANNEL_ID
+from config import Config, DISCORD_MESSAGE_LIMIT, WELCOME_CHANNEL_ID, WEEKLY_REPORT_PREWARM_MINUTES
 from api_client import APIClient
-from commands import BotCommands, is_authorized_user
-from utils import increment_count
+from commands import BotCommands, is_authorized_user, parse_report_args
+from channel_registry import ChannelRegistry
 from chat_logger import ChatLogger
+from chat_archive import ChatArchiver
+from chat_search import ChatSearch
+from db import close_databases
+from response_cache import ResponseCache
+from history_report import HistoryReport, format_history_report
+from message_stream import split_point
 from weekly_report import WeeklyReport
 from spam_detector import SpamDetector
+from welcome import Welcomer
 
 logger = logging.getLogger(__name__)
 
+WEEKLY_REPORT_TIME = time(hour=12, minute=0, tzinfo=pytz.timezone('US/Eastern'))
+WEEKLY_REPORT_PREWARM_TIME = (
+    datetime.combine(datetime.min, WEEKLY_REPORT_TIME.replace(tzinfo=None))
+    - timedelta(minutes=WEEKLY_REPORT_PREWARM_MINUTES)
+).time().replace(tzinfo=WEEKLY_REPORT_TIME.tzinfo)
+
 class ProLUGBot:
     def __init__(self):
         self.config = Config()
         self.api_client = APIClient(self.config.groq_key, self.config.perplexity_api_key)
-        self.bot_commands = BotCommands(self.api_client)
         self.chat_logger = ChatLogger()
         self.weekly_report = WeeklyReport()
+        self.chat_archiver = ChatArchiver()
+        self.chat_search = ChatSearch()
+        self.history_report = HistoryReport()
+        self._history_lock = asyncio.Lock()
+        self.response_cache = ResponseCache()
+        self.channels = ChannelRegistry()
+        self.bot_commands = BotCommands(self.api_client, self.chat_search, self.response_cache, self.channels)
 
         # Setup Discord bot
         intents = discord.Intents.default()
@@ -30,16 +50,24 @@ class ProLUGBot:
         intents.message_content = True
         self.client = commands.Bot(command_prefix='!', intents=intents)
 
-        # Override close() to clean up the API session on shutdown
+        # Override close() to clean up the API session and flush chat logs on shutdown
         original_close = self.client.close
         api_client = self.api_client
+        chat_logger = self.chat_logger
+        weekly_report = self.weekly_report
         async def _close_with_cleanup():
             logger.info("Bot shutting down, closing API session")
+            await self.welcomer.stop()
             await api_client.close()
+            weekly_report.close()
+            logger.info("Flushing queued chat messages")
+            await asyncio.to_thread(chat_logger.close)
+            await asyncio.to_thread(close_databases)
             await original_close()
         self.client.close = _close_with_cleanup
 
-        self.spam_detector = SpamDetector(self.client)
+        self.spam_detector = SpamDetector(self.client, self.channels)
+        self.welcomer = Welcomer(self.api_client, self.channels)
 
         self._setup_scheduled_tasks()
         self._setup_events()
@@ -51,41 +79,46 @@ class ProLUGBot:
         @self.client.event
         async def on_ready():
             logger.info("Logged in as a bot %s", self.client.user)
+            self.channels.build(self.client.guilds)
+            # Connect to the API hosts now rather than on the first user command
+            asyncio.create_task(self.api_client.prewarm())
+            # Keep pre-generated welcome templates ready for new members
+            self.welcomer.start()
             # Start scheduled tasks after bot is ready
             if not self.send_weekly_report.is_running():
                 self.send_weekly_report.start()
+            if not self.prewarm_weekly_report.is_running():
+                self.prewarm_weekly_report.start()
+            if not self.chat_log_maintenance.is_running():
+                self.chat_log_maintenance.start()
+
+        @self.client.event
+        async def on_guild_join(guild):
+            self.channels.add_guild(guild)
+
+        @self.client.event
+        async def on_guild_remove(guild):
+            self.channels.remove_guild(guild)
+
+        @self.client.event
+        async def on_guild_channel_create(channel):
+            self.channels.add(channel)
+
+        @self.client.event
+        async def on_guild_channel_delete(channel):
+            self.channels.remove(channel)
+
+        @self.client.event
+        async def on_guild_channel_update(before, after):
+            self.channels.update(before, after)
 
         @self.client.event
         async def on_member_join(member):
-            channel = self.client.get_channel(WELCOME_CHANNEL_ID)
-            if not channel:
-                logger.warning("Welcome channel %s not found", WELCOME_CHANNEL_ID)
-                return
-            
-            prompt = f"Talk like an angry unix administrator and make your response short. Welcome {member.mention} to the ProLUG discord and encourage them to ask questions about linux. Make sure to state their name in the welcome message. Limit the response to two sentences."
-            
-            messages = [
-                {"role": "system", "content": "You are a grumpy unix administrator who welcomes new users to a Linux discord server."},
-                {"role": "user", "content": prompt}
-            ]
-            
-            response = await self.api_client.make_groq_request(messages)
-            
-            logger.debug("Welcome API response: %s", response)
-            logger.debug("Welcome API response length: %s", len(response) if response else 0)
-            
-            if response and len(response) >= 10:
-                await channel.send(response)
-                logger.info("Sent welcome message to %s", member.name)
-            else:
-                default_message = f"Welcome, {member.mention}! Feel free to look around and ask any questions."
-                await channel.send(default_message)
-                logger.warning("Sent default welcome to %s - API response was: %s", member.name, response)
-            
-            increment_count("welcome")
-            
+            await self.welcomer.member_joined(member)
+
             # Congratulate milestone members
-            if member.guild.member_count % 500 == 0:
+            channel = self.channels.get_by_id(WELCOME_CHANNEL_ID)
+            if channel and member.guild.member_count % 500 == 0:
                 await channel.send(f'🎉🎊 @here - Congratulations {member.mention}! 🎉🎊 You are member number {member.guild.member_count}! 🥳🎈')
         
         @self.client.event
@@ -143,24 +176,183 @@ class ProLUGBot:
             """Generate and send the weekly report (authorized users only)."""
             await ctx.send("Generating weekly report...")
 
-            # Get statistics
-            stats = self.weekly_report.get_weekly_stats()
+            # Stats and AI topic are memoized until new messages are logged
+            stats = await self.weekly_report.get_weekly_report(self.api_client)
 
             if stats:
-                # Use AI to get better topic analysis if there are messages
-                if stats['total_messages'] > 0 and stats['all_messages']:
-                    ai_topic = await self.weekly_report.generate_report_with_ai(
-                        self.api_client,
-                        stats['all_messages']
-                    )
-                    if ai_topic:
-                        stats['most_discussed_topic'] = ai_topic
-
-                # Format the report
                 report = self.weekly_report.format_report(stats)
                 await ctx.send(report)
             else:
                 await ctx.send("Failed to generate weekly report statistics.")
+
+        @self.client.command()
+        @is_authorized_user()
+        async def report(ctx, *, args: str = ""):
+            """Report on any window and scope, e.g. `!report 30d #general @user` (authorized users only)."""
+            try:
+                label, start, end, channel_id, user_id = parse_report_args(args)
+            except ValueError as e:
+                await ctx.send(f"Invalid report arguments: {e}\n"
+                               "Usage: !report [24h|7d|30d|YYYY-MM-DD..YYYY-MM-DD] [#channel] [@user]")
+                return
+
+            async with ctx.typing():
+                stats = await self.weekly_report.get_report_stats_async(start, end, channel_id, user_id)
+            if stats is None:
+                await ctx.send("Failed to generate report statistics.")
+                return
+
+            scope = ""
+            if channel_id:
+                scope += f" in <#{channel_id}>"
+            if user_id:
+                scope += f" for <@{user_id}>"
+            await ctx.send(self.weekly_report.format_report(stats, window=label + scope))
+
+        @self.client.command()
+        @is_authorized_user()
+        async def history_report(ctx, year: int = None):
+            """Recap the full chat history, or one year with `!history_report 2025` (authorized users only)."""
+            if self._history_lock.locked():
+                await ctx.send("A history report is already running.")
+                return
+            start = end = None
+            title = "Chat History"
+            if year is not None:
+                start = int(datetime(year, 1, 1, tzinfo=pytz.utc).timestamp())
+                end = int(datetime(year + 1, 1, 1, tzinfo=pytz.utc).timestamp())
+                title = f"{year} in Review"
+
+            async with self._history_lock:
+                await ctx.send("Generating history report, this can take a while...")
+                try:
+                    stats = await asyncio.to_thread(self.history_report.run, start, end)
+                except Exception:
+                    logger.error("History report failed", exc_info=True)
+                    await ctx.send("Failed to generate history report.")
+                    return
+            await ctx.send(format_history_report(stats, title))
+
+        @self.client.command()
+        @is_authorized_user()
+        async def report_status(ctx, action: str = None):
+            """Show weekly report progress, or cancel it with `!report_status cancel` (authorized users only)."""
+            if action == "cancel":
+                if self.weekly_report.cancel():
+                    await ctx.send("Cancelling the running weekly report.")
+                else:
+                    await ctx.send("No weekly report is running.")
+                return
+
+            progress = self.weekly_report.progress
+            if progress.state == "idle":
+                await ctx.send("No weekly report has run yet.")
+                return
+            await ctx.send(
+                f"Weekly report: {progress.state} ({progress.stage})\n"
+                f"Messages analyzed: {progress.rows_processed:,} of up to {progress.rows_expected:,}\n"
+                f"Elapsed: {progress.elapsed:.1f}s"
+            )
+
+        @self.client.command()
+        @is_authorized_user()
+        async def rebuild_rollups(ctx):
+            """Backfill the activity rollup tables from chat history (authorized users only)."""
+            await ctx.send("Rebuilding activity rollups...")
+            try:
+                total = await asyncio.to_thread(self.chat_logger.rebuild_rollups, self.chat_archiver)
+            except sqlite3.Error:
+                logger.error("Failed to rebuild activity rollups", exc_info=True)
+                await ctx.send("Failed to rebuild activity rollups.")
+                return
+            self.weekly_report.clear_cache()
+            await ctx.send(f"Activity rollups rebuilt from {total:,} messages.")
+
+        @self.client.command()
+        @is_authorized_user()
+        async def rebuild_search_index(ctx):
+            """Rebuild the full-text search index from chat history (authorized users only)."""
+            await ctx.send("Rebuilding search index...")
+            try:
+                total = await asyncio.to_thread(self.chat_search.rebuild_index)
+            except sqlite3.Error:
+                logger.error("Failed to rebuild search index", exc_info=True)
+                await ctx.send("Failed to rebuild search index.")
+                return
+            await ctx.send(f"Search index rebuilt from {total:,} messages.")
+
+        @self.client.command()
+        @is_authorized_user()
+        async def purge_ask_cache(ctx):
+            """Drop every cached !ask answer (authorized users only)."""
+            try:
+                removed = await asyncio.to_thread(self.response_cache.purge)
+            except sqlite3.Error:
+                logger.error("Failed to purge the !ask cache", exc_info=True)
+                await ctx.send("Failed to purge the !ask cache.")
+                return
+            await ctx.send(f"Purged {removed:,} cached !ask answers.")
+
+        @self.client.command()
+        @is_authorized_user()
+        async def perf_stats(ctx):
+            """Show internal performance counters (authorized users only)."""
+            log_stats = self.chat_logger.stats()
+            cache_stats = self.weekly_report.cache_stats()
+            ask_stats = self.response_cache.stats()
+            llm_stats = self.api_client.coalescing_stats()
+            welcome_stats = self.welcomer.stats()
+            report = (
+                f"**Chat Logger**\n"
+                f"Mode: {'write-behind' if log_stats['write_behind'] else 'synchronous'}\n"
+                f"Queue depth: {log_stats['queue_depth']}/{log_stats['queue_capacity']}\n"
+                f"Written: {log_stats['written']} | Dropped: {log_stats['dropped']} | Failed: {log_stats['failed']}\n"
+                f"Flushes: {log_stats['batches']} (last {log_stats['last_flush_ms']:.1f} ms, "
+                f"avg {log_stats['avg_flush_ms']:.1f} ms, max {log_stats['max_flush_ms']:.1f} ms)\n"
+                f"**Report Cache**\n"
+                f"Entries: {cache_stats['size']}/{cache_stats['capacity']} | "
+                f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']}\n"
+                f"**!ask Cache**\n"
+                f"Memory entries: {ask_stats['memory_entries']} | Hits: {ask_stats['memory_hits']} memory, "
+                f"{ask_stats['disk_hits']} disk | Misses: {ask_stats['misses']} ({ask_stats['hit_rate']:.0%} hit rate)\n"
+                f"**Welcomes**\n"
+                f"Templates ready: {welcome_stats['ready']}/{welcome_stats['capacity']} | "
+                f"Sent: {welcome_stats['messages_sent']} messages for {welcome_stats['members_welcomed']} members | "
+                f"Default text used: {welcome_stats['fallbacks']}\n"
+                f"**LLM Requests**\n"
+                f"Upstream: {llm_stats['upstream_calls']} | Coalesced: {llm_stats['coalesced_calls']}\n" + "".join(
+                    f"{name}: {sched['active']} active, {sched['queued']} queued, {sched['retries']} retries, "
+                    f"{sched['failures']} failures | Queue wait avg {sched['queue_wait']['avg']:.2f}s, "
+                    f"max {sched['queue_wait']['max']:.2f}s | "
+                    + " ".join(f"{label}: {count}" for label, count in sched['queue_wait']['buckets'].items()) + "\n"
+                    for name, sched in self.api_client.scheduler_stats().items()
+                ) +
+                "**LLM Profiles**\n" + "".join(
+                    f"{name}: {prof['requests']} requests, p50 {prof['p50']:.1f}s, p95 {prof['p95']:.1f}s | "
+                    f"Failed: {prof['failures']}, timed out: {prof['timeouts']} | "
+                    f"Hedged: {prof['hedges']} (won {prof['hedge_wins']}) | "
+                    f"Tokens: {prof['prompt_tokens']} in, {prof['completion_tokens']} out, ${prof['cost']:.4f}\n"
+                    for name, prof in self.api_client.profile_stats_summary().items()
+                ) +
+                "**Circuit Breakers**\n" + "".join(
+                    f"{name}: {breaker['state']}"
+                    + (f" (probe in {breaker['retry_in']:.0f}s)" if breaker['state'] == 'open' else "")
+                    + f" | {breaker['calls']} calls, {breaker['failures']} failed ({breaker['slow_calls']} slow), "
+                    f"{breaker['short_circuited']} short-circuited, opened {breaker['opens']}x\n"
+                    for name, breaker in self.api_client.breaker_stats().items()
+                ) +
+                "**HTTP Connections**\n" + "\n".join(
+                    f"{name}: {http['requests']} requests, {http['new_connections']} new "
+                    f"(avg {http['avg_connect_ms']:.0f} ms), {http['reused_connections']} reused, "
+                    f"DNS {http['dns_cache_hits']}/{http['dns_cache_hits'] + http['dns_cache_misses']} cached"
+                    for name, http in self.api_client.connection_stats().items()
+                )
+            )
+            # Sections outgrow one message; split on line boundaries
+            while report:
+                cut = split_point(report, DISCORD_MESSAGE_LIMIT) if len(report) > DISCORD_MESSAGE_LIMIT else len(report)
+                await ctx.send(report[:cut])
+                report = report[cut:]
     
     async def _route_message(self, message: discord.Message) -> None:
         """Route messages to appropriate command handlers."""
@@ -171,6 +363,8 @@ class ProLUGBot:
             await self.bot_commands.handle_ask_command(message)
         elif content.startswith("!chat "):
             await self.bot_commands.handle_chat_command(message)
+        elif content == "!search" or content.startswith("!search "):
+            await self.bot_commands.handle_search_command(message)
         elif content.startswith("!addkey "):
             await self.bot_commands.handle_addkey_command(message)
         elif content == "!removekey":
@@ -186,7 +380,14 @@ class ProLUGBot:
     def _setup_scheduled_tasks(self):
         """Setup scheduled tasks like weekly reports."""
 
-        @tasks.loop(time=time(hour=12, minute=0, tzinfo=pytz.timezone('US/Eastern')))
+        def _scheduled_report_window():
+            """The 7 days ending at this Sunday's post time, shared by the pre-warm and the post."""
+            eastern = pytz.timezone('US/Eastern')
+            post_at = eastern.localize(datetime.combine(datetime.now(eastern).date(), WEEKLY_REPORT_TIME.replace(tzinfo=None)))
+            end = int(post_at.timestamp())
+            return end - 7 * 86400, end
+
+        @tasks.loop(time=WEEKLY_REPORT_TIME)
         async def send_weekly_report():
             """Send weekly report every Sunday at noon EST."""
             # Check if today is Sunday (weekday 6)
@@ -195,31 +396,16 @@ class ProLUGBot:
 
             logger.info("Generating scheduled weekly report")
 
-            # Get statistics
-            stats = self.weekly_report.get_weekly_stats()
+            # Normally a cache hit on the report pre-warmed before noon
+            start, end = _scheduled_report_window()
+            stats = await self.weekly_report.get_weekly_report(self.api_client, start, end, allow_stale=True)
 
             if stats:
-                # Use AI to get better topic analysis if there are messages
-                if stats['total_messages'] > 0 and stats['all_messages']:
-                    ai_topic = await self.weekly_report.generate_report_with_ai(
-                        self.api_client,
-                        stats['all_messages']
-                    )
-                    if ai_topic:
-                        stats['most_discussed_topic'] = ai_topic
-
                 # Format the report
                 report = self.weekly_report.format_report(stats)
 
                 # Find the "general" channel (case insensitive)
-                general_channel = None
-                for guild in self.client.guilds:
-                    for channel in guild.text_channels:
-                        if channel.name.lower() == "general":
-                            general_channel = channel
-                            break
-                    if general_channel:
-                        break
+                general_channel = self.channels.find("general")
 
                 if general_channel:
                     await general_channel.send(report)
@@ -229,13 +415,39 @@ class ProLUGBot:
             else:
                 logger.error("Failed to generate weekly report statistics")
 
+        @tasks.loop(time=WEEKLY_REPORT_PREWARM_TIME)
+        async def prewarm_weekly_report():
+            """Compute Sunday's report and AI topic ahead of the noon post."""
+            if datetime.now(pytz.timezone('US/Eastern')).weekday() != 6:
+                return
+            logger.info("Pre-warming weekly report")
+            start, end = _scheduled_report_window()
+            if await self.weekly_report.get_weekly_report(self.api_client, start, end) is None:
+                logger.warning("Weekly report pre-warm failed; the noon post will compute it")
+
+        @prewarm_weekly_report.before_loop
+        async def before_prewarm_weekly_report():
+            await self.client.wait_until_ready()
+
         @send_weekly_report.before_loop
         async def before_weekly_report():
             """Wait until the bot is ready before starting the scheduled task."""
             await self.client.wait_until_ready()
 
-        # Store the task as an instance variable (will be started in on_ready)
+        @tasks.loop(time=time(hour=4, minute=0, tzinfo=pytz.timezone('US/Eastern')))
+        async def chat_log_maintenance():
+            """Update the topic baseline, archive old chat logs and shrink the database every night at 4am EST."""
+            try:
+                await asyncio.to_thread(self.chat_logger.update_term_baseline)
+                await asyncio.to_thread(self.response_cache.purge_expired)
+                await asyncio.to_thread(self.chat_archiver.run_maintenance)
+            except sqlite3.Error:
+                logger.error("Chat log maintenance failed", exc_info=True)
+
+        # Store the tasks as instance variables (will be started in on_ready)
         self.send_weekly_report = send_weekly_report
+        self.prewarm_weekly_report = prewarm_weekly_report
+        self.chat_log_maintenance = chat_log_maintenance
     
     def run(self):
         """Start the bot."""
@@ -0,0 +1,118 @@
+"""Fixed-memory approximate top-k counting (Space-Saving).
+
+A SpaceSaving sketch tracks at most `capacity` items. Every tracked count is
+an upper bound on the true count, overestimated by at most the item's recorded
+error; any untracked item occurred at most `floor` times. With N total
+occurrences, no estimate is off by more than N / capacity.
+
+Sketches serialize to compact bytes and merge, so per-day sketches can be
+stored once and combined for long report windows in bounded memory.
+"""
+import heapq
+import json
+import zlib
+
+
+class SpaceSaving:
+    """Space-Saving heavy-hitter summary with mergeable, serializable state."""
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def floor(self):
+        """Upper bound on the count of any item not tracked by the sketch."""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    @property
+    def max_error(self):
+        """Worst-case overestimate of any count, tracked or not."""
+        return max(self.floor, max(self.errors.values(), default=0))
+
+    def add(self, item, count=1):
+        """Record `count` more occurrences of item."""
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            # Replace the smallest entry; the newcomer inherits its count as error
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            del self.errors[victim]
+            self.counts[item] = floor + count
+            self.errors[item] = floor
+
+    @classmethod
+    def from_counts(cls, pairs, capacity, total=None):
+        """Build a sketch from exact (item, count) pairs.
+
+        Keeps the `capacity` largest counts with zero error; everything
+        dropped is bounded by the smallest kept count. `total` defaults to the
+        sum of the given counts.
+        """
+        pairs = list(pairs)
+        sketch = cls(capacity)
+        sketch.total = total if total is not None else sum(count for _, count in pairs)
+        for item, count in heapq.nlargest(capacity, pairs, key=lambda pair: pair[1]):
+            sketch.counts[item] = count
+            sketch.errors[item] = 0
+        return sketch
+
+    def merge(self, other):
+        """Fold another sketch into this one (mergeable Space-Saving).
+
+        An item missing from one side is charged that side's floor, both as
+        count and as error, so estimates stay upper bounds after merging.
+        """
+        self_floor, other_floor = self.floor, other.floor
+        merged_counts = {}
+        merged_errors = {}
+        for item in self.counts.keys() | other.counts.keys():
+            merged_counts[item] = self.counts.get(item, self_floor) + other.counts.get(item, other_floor)
+            merged_errors[item] = (self.errors.get(item, self_floor) +
+                                   other.errors.get(item, other_floor))
+
+        keep = heapq.nlargest(self.capacity, merged_counts, key=merged_counts.get)
+        self.counts = {item: merged_counts[item] for item in keep}
+        self.errors = {item: merged_errors[item] for item in keep}
+        self.total += other.total
+        return self
+
+    def top(self, n):
+        """Return the n largest items as (item, count, error) tuples.
+
+        The true count of each item lies in [count - error, count].
+        """
+        items = heapq.nlargest(n, self.counts, key=self.counts.get)
+        return [(item, self.counts[item], self.errors[item]) for item in items]
+
+    def to_bytes(self):
+        state = {
+            'capacity': self.capacity,
+            'total': self.total,
+            'items': [[item, self.counts[item], self.errors[item]] for item in self.counts],
+        }
+        return zlib.compress(json.dumps(state, separators=(',', ':')).encode())
+
+    @classmethod
+    def from_bytes(cls, data):
+        state = json.loads(zlib.decompress(data))
+        sketch = cls(state['capacity'])
+        sketch.total = state['total']
+        for item, count, error in state['items']:
+            sketch.counts[item] = count
+            sketch.errors[item] = error
+        return sketch
@@ -0,0 +1,310 @@
+"""Full-history chat statistics computed in parallel over month shards.
+
+The requested range is split into calendar-month shards (matching the monthly
+archive files). Each shard is scanned in a worker process with its own
+read-only connection, producing exact user/channel counts and Space-Saving
+word/bigram sketches. The parent merges the partial results and checkpoints
+every finished shard, so an interrupted run picks up where it stopped and a
+later run over the same months only scans what changed since.
+
+Usage: python history_report.py [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--workers N] [--fresh]
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import sqlite3
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from chat_archive import ChatArchiver, month_bounds, month_key
+from config import (
+    CHAT_ARCHIVE_DIR,
+    CHAT_DB_PATH,
+    EXCLUDED_CHANNELS_FROM_TOPIC,
+    HISTORY_CHECKPOINT_PATH,
+    HISTORY_SKETCH_CAPACITY,
+    HISTORY_WORKERS,
+)
+from db import connect
+from heavy_hitters import SpaceSaving
+from text_analytics import TermCounter, format_topic
+
+logger = logging.getLogger(__name__)
+
+# Shards ending less than this long ago may still receive messages, so are never checkpointed
+SETTLE_SECONDS = 86400
+
+
+def month_shards(start, end):
+    """Split [start, end) into (start, end) pieces that never cross a UTC month boundary."""
+    shards = []
+    while start < end:
+        shard_end = min(month_bounds(month_key(start))[1], end)
+        shards.append((start, shard_end))
+        start = shard_end
+    return shards
+
+
+def scan_shard(db_path, archive_dir, start, end, capacity):
+    """Worker entry point: statistics for messages with start <= ts < end.
+
+    Opens its own read-only connection (archives are attached read-only) and
+    returns a picklable dict of partial results.
+    """
+    conn = connect(db_path, read_only=True)
+    try:
+        excluded = sorted(EXCLUDED_CHANNELS_FROM_TOPIC)
+        excluded_ids = {row[0] for row in conn.execute(
+            f"SELECT channel_id FROM channels WHERE channel_name IN ({', '.join('?' * len(excluded))})",
+            excluded
+        )}
+        users = Counter()
+        channels = Counter()
+        terms = TermCounter()
+        archiver = ChatArchiver(db_path, archive_dir)
+        for _, _, user_id, channel_id, content in archiver.iter_messages(start, end, conn):
+            users[user_id] += 1
+            channels[channel_id] += 1
+            if channel_id not in excluded_ids:
+                terms.add(content or '')
+    finally:
+        conn.close()
+
+    return {
+        'users': list(users.items()),
+        'channels': list(channels.items()),
+        'topic_messages': terms.message_count,
+        'words': SpaceSaving.from_counts(terms.words.items(), capacity).to_bytes(),
+        'bigrams': SpaceSaving.from_counts(
+            ((f"{a} {b}", count) for (a, b), count in terms.bigrams.items()), capacity
+        ).to_bytes(),
+    }
+
+
+class HistoryCheckpoint:
+    """Finished shard results in a small SQLite file, keyed by shard bounds."""
+
+    def __init__(self, path=HISTORY_CHECKPOINT_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS shard_results (
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL,
+                capacity INTEGER NOT NULL,
+                result BLOB NOT NULL,
+                completed_at TEXT NOT NULL,
+                PRIMARY KEY (start, end, capacity)
+            )
+        ''')
+        self.conn.commit()
+
+    def load(self, start, end, capacity):
+        row = self.conn.execute(
+            "SELECT result FROM shard_results WHERE start = ? AND end = ? AND capacity = ?",
+            (start, end, capacity)
+        ).fetchone()
+        if row is None:
+            return None
+        result = json.loads(zlib.decompress(row[0]))
+        result['words'] = bytes.fromhex(result['words'])
+        result['bigrams'] = bytes.fromhex(result['bigrams'])
+        return result
+
+    def save(self, start, end, capacity, result):
+        data = dict(result, words=result['words'].hex(), bigrams=result['bigrams'].hex())
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO shard_results (start, end, capacity, result, completed_at) VALUES (?, ?, ?, ?, ?)",
+                (start, end, capacity, zlib.compress(json.dumps(data).encode()),
+                 datetime.now(timezone.utc).isoformat())
+            )
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM shard_results")
+
+    def close(self):
+        self.conn.close()
+
+
+class HistoryReport:
+    """Parallel, resumable statistics over the full chat history (hot and archived)."""
+
+    def __init__(self, db_path=CHAT_DB_PATH, archive_dir=CHAT_ARCHIVE_DIR,
+                 checkpoint_path=HISTORY_CHECKPOINT_PATH, workers=HISTORY_WORKERS,
+                 capacity=HISTORY_SKETCH_CAPACITY):
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        self.capacity = capacity
+
+    def history_start(self):
+        """Start of the month holding the oldest logged message, or None if there are none.
+
+        Month-aligned so the first shard keeps the same checkpoint key from run to run.
+        """
+        archiver = ChatArchiver(self.db_path, self.archive_dir)
+        months = archiver.archived_months()
+        if months:
+            return month_bounds(months[0])[0]
+        conn = connect(self.db_path, read_only=True)
+        try:
+            oldest = conn.execute("SELECT MIN(ts) FROM messages").fetchone()[0]
+        finally:
+            conn.close()
+        return month_bounds(month_key(oldest))[0] if oldest is not None else None
+
+    def run(self, start=None, end=None, fresh=False):
+        """Compute statistics for start <= ts < end (defaults: all history up to now).
+
+        Blocks until every shard is done. With fresh=True checkpointed shards
+        are discarded first. Returns the merged stats dict, or None when there
+        is no history.
+        """
+        started = time.perf_counter()
+        end = end if end is not None else int(time.time()) + 1
+        start = start if start is not None else self.history_start()
+        if start is None:
+            return None
+
+        checkpoint = HistoryCheckpoint(self.checkpoint_path)
+        try:
+            if fresh:
+                checkpoint.clear()
+            shards = month_shards(start, end)
+            results = []
+            pending = []
+            for shard in shards:
+                cached = checkpoint.load(*shard, self.capacity)
+                if cached is not None:
+                    results.append(cached)
+                else:
+                    pending.append(shard)
+            resumed = len(results)
+            logger.info("History report: %d shards (%d from checkpoint) with %d workers",
+                        len(shards), resumed, self.workers)
+
+            if pending:
+                settled_before = time.time() - SETTLE_SECONDS
+                # spawn: the bot process has threads, which fork() would copy in an undefined state
+                context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+                    futures = {
+                        pool.submit(scan_shard, self.db_path, self.archive_dir, shard_start, shard_end,
+                                    self.capacity): (shard_start, shard_end)
+                        for shard_start, shard_end in pending
+                    }
+                    for future in as_completed(futures):
+                        shard_start, shard_end = futures[future]
+                        result = future.result()
+                        if shard_end <= settled_before:
+                            checkpoint.save(shard_start, shard_end, self.capacity, result)
+                        results.append(result)
+                        logger.info("History shard %s done (%d/%d)", month_key(shard_start),
+                                    len(results), len(shards))
+        finally:
+            checkpoint.close()
+
+        stats = self._merge(results)
+        stats.update({
+            'start': start,
+            'end': end,
+            'shards': len(shards),
+            'resumed_shards': resumed,
+            'elapsed': time.perf_counter() - started,
+        })
+        return stats
+
+    def _merge(self, results):
+        users = Counter()
+        channels = Counter()
+        words = SpaceSaving(self.capacity)
+        bigrams = SpaceSaving(self.capacity)
+        topic_messages = 0
+        for result in results:
+            users.update(dict(result['users']))
+            channels.update(dict(result['channels']))
+            words.merge(SpaceSaving.from_bytes(result['words']))
+            bigrams.merge(SpaceSaving.from_bytes(result['bigrams']))
+            topic_messages += result['topic_messages']
+
+        top_users = users.most_common(10)
+        top_channels = channels.most_common(10)
+        conn = connect(self.db_path, read_only=True)
+        try:
+            usernames = dict(conn.execute(
+                f"SELECT user_id, username FROM users WHERE user_id IN ({', '.join('?' * len(top_users))})",
+                [user_id for user_id, _ in top_users]
+            ))
+            channel_names = dict(conn.execute(
+                f"SELECT channel_id, channel_name FROM channels WHERE channel_id IN ({', '.join('?' * len(top_channels))})",
+                [channel_id for channel_id, _ in top_channels]
+            ))
+        finally:
+            conn.close()
+
+        top_words = words.top(30)
+        return {
+            'total_messages': sum(users.values()),
+            'distinct_users': len(users),
+            'top_chatters': [(user_id, usernames.get(user_id), count) for user_id, count in top_users],
+            'top_channels': [(channel_id, channel_names.get(channel_id), count)
+                             for channel_id, count in top_channels],
+            'most_discussed_topic': format_topic([(w, c) for w, c, _ in top_words]) if topic_messages else "No messages",
+            'topic_message_count': topic_messages,
+            'word_stats': {
+                'words': [(w, c) for w, c, _ in top_words],
+                'bigrams': [(b, c) for b, c, _ in bigrams.top(20)],
+            },
+            'max_error': {'words': words.max_error, 'bigrams': bigrams.max_error},
+        }
+
+
+def format_history_report(stats, title="Chat History"):
+    """Format merged history statistics as a Discord-sized recap."""
+    if not stats or not stats['total_messages']:
+        return f"📊 **{title}**\n\nNo messages were logged in this range!"
+
+    start = datetime.fromtimestamp(stats['start'], timezone.utc).strftime('%Y-%m-%d')
+    end = datetime.fromtimestamp(stats['end'] - 1, timezone.utc).strftime('%Y-%m-%d')
+    report = f"📊 **{title} ({start} to {end})**\n\n"
+    report += f"💬 **Total Messages:** {stats['total_messages']:,} from {stats['distinct_users']:,} members\n"
+    report += "🏆 **Top Chatters:** " + ", ".join(
+        f"<@{user_id}> ({count:,})" for user_id, _, count in stats['top_chatters'][:5]
+    ) + "\n"
+    report += "📢 **Most Active Channels:** " + ", ".join(
+        f"#{name or channel_id} ({count:,})" for channel_id, name, count in stats['top_channels'][:5]
+    ) + "\n"
+    report += f"🔥 **Most Discussed Topic:** {stats['most_discussed_topic']}\n"
+    return report
+
+
+def _parse_date(value):
+    return int(datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute chat statistics over the full history.")
+    parser.add_argument('--db', default=CHAT_DB_PATH, help="chat log database")
+    parser.add_argument('--archive-dir', default=CHAT_ARCHIVE_DIR)
+    parser.add_argument('--checkpoint', default=HISTORY_CHECKPOINT_PATH)
+    parser.add_argument('--start', type=_parse_date, help="first day (YYYY-MM-DD, UTC); default: oldest message")
+    parser.add_argument('--end', type=_parse_date, help="day after the last one (YYYY-MM-DD, UTC); default: now")
+    parser.add_argument('--workers', type=int, default=HISTORY_WORKERS)
+    parser.add_argument('--fresh', action='store_true', help="ignore checkpointed shards")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(name)s: %(message)s')
+    engine = HistoryReport(args.db, args.archive_dir, args.checkpoint, args.workers)
+    stats = engine.run(args.start, args.end, fresh=args.fresh)
+    print(format_history_report(stats))
+    if stats:
+        print(f"{stats['shards']} shards ({stats['resumed_shards']} from checkpoint) in {stats['elapsed']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from config import HTTP_CONNECT_TIMEOUT, HTTP_DNS_CACHE_TTL, HTTP_ENDPOINTS, HTTP_KEEPALIVE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+
+class EndpointStats:
+    """Connection reuse counters for one endpoint, fed by aiohttp tracing."""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+        self.connect_ms_total = 0.0
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections,
+            'dns_cache_hits': self.dns_cache_hits,
+            'dns_cache_misses': self.dns_cache_misses,
+            'avg_connect_ms': self.connect_ms_total / self.new_connections if self.new_connections else 0.0,
+        }
+
+
+def _trace_config(stats: EndpointStats) -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        stats.requests += 1
+
+    async def on_connection_create_start(session, ctx, params):
+        ctx.connect_started = time.perf_counter()
+
+    async def on_connection_create_end(session, ctx, params):
+        stats.new_connections += 1
+        stats.connect_ms_total += (time.perf_counter() - ctx.connect_started) * 1000
+
+    async def on_connection_reuseconn(session, ctx, params):
+        stats.reused_connections += 1
+
+    async def on_dns_cache_hit(session, ctx, params):
+        stats.dns_cache_hits += 1
+
+    async def on_dns_cache_miss(session, ctx, params):
+        stats.dns_cache_misses += 1
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_start.append(on_connection_create_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace.on_dns_cache_miss.append(on_dns_cache_miss)
+    return trace
+
+
+class SessionManager:
+    """One aiohttp session per API host, each with its own tuned connection pool.
+
+    Pools cap concurrent connections per host, cache DNS and keep idle
+    connections alive, so requests after the first skip DNS, TCP and TLS
+    setup. prewarm() opens a connection to every host ahead of user traffic.
+    """
+
+    def __init__(self, endpoints: Dict[str, dict] = HTTP_ENDPOINTS):
+        self.endpoints = endpoints
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._stats = {name: EndpointStats() for name in endpoints}
+
+    def session(self, name: str) -> aiohttp.ClientSession:
+        """Return the session for an endpoint, creating it on first use (inside the event loop)."""
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            endpoint = self.endpoints[name]
+            connector = aiohttp.TCPConnector(
+                limit=endpoint['limit'],
+                limit_per_host=endpoint['limit'],
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout(name),
+                trace_configs=[_trace_config(self._stats[name])],
+            )
+            self._sessions[name] = session
+        return session
+
+    def timeout(self, name: str) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=self.endpoints[name]['timeout'], sock_connect=HTTP_CONNECT_TIMEOUT)
+
+    async def prewarm(self) -> None:
+        """Open one pooled connection per endpoint so the first real request finds it warm."""
+        async def warm(name):
+            parts = urlsplit(self.endpoints[name]['url'])
+            origin = f"{parts.scheme}://{parts.netloc}/"
+            start = time.perf_counter()
+            try:
+                async with self.session(name).head(origin, allow_redirects=False,
+                                                   timeout=aiohttp.ClientTimeout(total=HTTP_CONNECT_TIMEOUT * 2)):
+                    pass
+                logger.info("Pre-warmed %s connection in %.0f ms", name, (time.perf_counter() - start) * 1000)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Could not pre-warm %s connection: %s", name, e)
+
+        await asyncio.gather(*(warm(name) for name in self.endpoints))
+
+    def stats(self) -> Dict[str, dict]:
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            if not session.closed:
+                await session.close()
+        self._sessions.clear()
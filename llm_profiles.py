@@ -0,0 +1,105 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from config import LLM_HEDGE_MIN_SAMPLES, LLM_LATENCY_WINDOW, LLM_MODEL_PRICES, LLM_PROFILES
+
+
+@dataclass(frozen=True)
+class RequestProfile:
+    """Model and limits for one kind of LLM request (see config.LLM_PROFILES)."""
+    name: str
+    model: str
+    max_tokens: int
+    reasoning_effort: str
+    deadline: float
+    hedge_model: Optional[str] = None
+
+    def payload(self, messages: list, stream: bool = False, model: Optional[str] = None) -> dict:
+        return {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": 1,
+            "max_completion_tokens": self.max_tokens,
+            "top_p": 1,
+            "reasoning_effort": self.reasoning_effort,
+            "stream": stream,
+            "stop": None
+        }
+
+
+def load_profiles(profiles: Dict[str, dict] = LLM_PROFILES) -> Dict[str, RequestProfile]:
+    return {name: RequestProfile(name=name, **settings) for name, settings in profiles.items()}
+
+
+def request_cost(model: str, usage: Optional[dict]) -> float:
+    """USD cost of a completion from its usage block (0 for unpriced models)."""
+    if not usage or model not in LLM_MODEL_PRICES:
+        return 0.0
+    input_price, output_price = LLM_MODEL_PRICES[model]
+    return (usage.get('prompt_tokens', 0) * input_price + usage.get('completion_tokens', 0) * output_price) / 1e6
+
+
+def estimate_usage(messages: list, text: str) -> dict:
+    """Rough usage block for a completion whose usage was never reported (~4 characters a token).
+
+    Reasoning tokens are not visible in the text, so the completion side is a lower bound.
+    """
+    prompt_chars = sum(len(message.get('content') or '') for message in messages)
+    return {'prompt_tokens': prompt_chars // 4 + 1, 'completion_tokens': len(text) // 4}
+
+
+def _percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ProfileStats:
+    """Latency, hedging and cost counters for one request profile.
+
+    `latencies` are end to end, as the caller saw them; for streamed
+    requests that is the time to first text. `primary_latencies` are the
+    primary model's alone and set the hedge delay; a primary that lost a
+    hedge race is recorded at the time it was abandoned, a lower bound that
+    keeps the p95 from drifting down.
+    """
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.primary_latencies = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait for the primary before hedging, or None while there is too little history."""
+        if len(self.primary_latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return _percentile(self.primary_latencies, 0.95)
+
+    def record_usage(self, model: str, usage: Optional[dict]) -> None:
+        if not usage:
+            return
+        self.prompt_tokens += usage.get('prompt_tokens', 0)
+        self.completion_tokens += usage.get('completion_tokens', 0)
+        self.cost += request_cost(model, usage)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'p50': _percentile(self.latencies, 0.5) if self.latencies else 0.0,
+            'p95': _percentile(self.latencies, 0.95) if self.latencies else 0.0,
+            'hedge_after': self.hedge_delay(),
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cost': self.cost,
+        }
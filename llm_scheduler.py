@@ -0,0 +1,202 @@
+import asyncio
+import bisect
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, Sequence, TypeVar
+
+from config import LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_MAX_RETRIES, LLM_QUEUE_WAIT_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Priority classes, lowest value served first
+PRIORITY_REPORT = 0          # Scheduled weekly report
+PRIORITY_INTERACTIVE = 1     # A user is waiting (!ask, !chat)
+PRIORITY_BACKGROUND = 2      # Flavor text (welcome messages)
+
+
+class RetryableError(Exception):
+    """A request failed in a way worth retrying (429, 5xx, connection error).
+
+    retry_after is the server's Retry-After hint in seconds, if it sent one.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `burst`.
+
+    pause() blocks the bucket until a deadline and leaves a single token for
+    when it ends, for when the server asks us to back off with Retry-After.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float) -> None:
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        # One request may probe as soon as the pause ends; the rest refill from there
+        self._tokens = 1.0
+        self._updated = self._paused_until
+
+    async def take(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class WaitHistogram:
+    """Histogram of queue wait times; counts are per bucket, not cumulative."""
+
+    def __init__(self, bounds: Sequence[float] = LLM_QUEUE_WAIT_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)   # Last bucket is "over the top bound"
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self):
+        count = sum(self.counts)
+        labels = [f"<={bound:g}s" for bound in self.bounds] + [f">{self.bounds[-1]:g}s"]
+        return {
+            'count': count,
+            'avg': self.total / count if count else 0.0,
+            'max': self.max,
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class LLMScheduler:
+    """Admission control in front of one LLM provider.
+
+    Requests wait for one of `concurrency` slots, handed out in priority
+    order (FIFO within a class), then for a rate-limit token. Retryable
+    failures are retried with jittered exponential backoff, honouring the
+    server's Retry-After, so a burst queues up instead of failing.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, concurrency: int,
+                 max_retries: int = LLM_MAX_RETRIES):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate, burst)
+        self._active = 0
+        self._waiters = []                   # Heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self.wait_histogram = WaitHistogram()
+        self.retries = 0
+        self.failures = 0
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE):
+        """Hold a concurrency slot and a rate-limit token for the duration of a request."""
+        start = time.monotonic()
+        await self._acquire(priority)
+        try:
+            await self._bucket.take()
+            self.wait_histogram.observe(time.monotonic() - start)
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int) -> None:
+        if self._active < self.concurrency and not self._waiters:
+            self._active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed to us just as we were cancelled; pass it on
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)      # Hand the slot over; _active is unchanged
+                return
+        self._active -= 1
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number `attempt` (0-based), with full jitter."""
+        if retry_after is not None:
+            delay = min(retry_after, LLM_BACKOFF_MAX)
+            self._bucket.pause(delay)
+            return delay + random.uniform(0, LLM_BACKOFF_BASE)
+        return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+    async def run(self, call: Callable[[], Awaitable[T]], priority: int = PRIORITY_INTERACTIVE) -> T:
+        """Run call() inside a slot, retrying RetryableError.
+
+        The last RetryableError is re-raised once the retries are used up.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.slot(priority):
+                    return await call()
+            except RetryableError as e:
+                if attempt == self.max_retries:
+                    self.failures += 1
+                    raise
+                delay = self.backoff(attempt, e.retry_after)
+                self.retries += 1
+                logger.info("%s request failed (%s), retry %d/%d in %.1fs",
+                            self.name, e, attempt + 1, self.max_retries, delay)
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {
+            'active': self._active,
+            'queued': sum(1 for _, _, waiter in self._waiters if not waiter.done()),
+            'retries': self.retries,
+            'failures': self.failures,
+            'queue_wait': self.wait_histogram.as_dict(),
+        }
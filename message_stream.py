@@ -0,0 +1,77 @@
+import logging
+import time
+from typing import AsyncIterable, Optional
+
+import discord
+
+from config import DISCORD_MESSAGE_LIMIT, STREAM_EDIT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+def split_point(text: str, limit: int) -> int:
+    """Where to cut text that is over limit: the last newline or space in the
+    second half of the window, else a hard cut at limit."""
+    for separator in ('\n', ' '):
+        cut = text.rfind(separator, limit // 2, limit)
+        if cut > 0:
+            return cut + 1
+    return limit
+
+
+class StreamingReply:
+    """Shows streamed text in a channel as it arrives.
+
+    The first fragment is posted straight away. After that, the message is
+    edited at most once per `edit_interval` seconds, which stays inside
+    Discord's per-channel edit rate limit. When the text outgrows one
+    message it is split, and the rest continues in a new message.
+    """
+
+    def __init__(self, channel: discord.abc.Messageable, edit_interval: float = STREAM_EDIT_INTERVAL,
+                 limit: int = DISCORD_MESSAGE_LIMIT):
+        self.channel = channel
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.text = ""                   # Everything received so far
+        self._current = ""               # Text belonging to the message being edited
+        self._shown = ""                 # What that message currently displays
+        self._message: Optional[discord.Message] = None
+        self._last_edit = 0.0
+
+    async def append(self, fragment: str) -> None:
+        self.text += fragment
+        self._current += fragment
+        while len(self._current) > self.limit:
+            cut = split_point(self._current, self.limit)
+            await self._show(self._current[:cut])
+            self._message = None
+            self._shown = ""
+            self._current = self._current[cut:]
+        if self._message is None or time.monotonic() - self._last_edit >= self.edit_interval:
+            await self._show(self._current)
+
+    async def finish(self) -> str:
+        """Show whatever is still pending and return the full text."""
+        await self._show(self._current)
+        return self.text
+
+    async def _show(self, content: str) -> None:
+        if not content.strip() or (self._message is not None and content == self._shown):
+            return
+        try:
+            if self._message is None:
+                self._message = await self.channel.send(content)
+            else:
+                await self._message.edit(content=content)
+        except discord.HTTPException as e:
+            logger.warning("Failed to update streamed reply: %s", e)
+            return
+        self._shown = content
+        self._last_edit = time.monotonic()
+
+    async def consume(self, fragments: AsyncIterable[str]) -> str:
+        """Stream every fragment into the channel. Returns the full text."""
+        async for fragment in fragments:
+            await self.append(fragment)
+        return await self.finish()
@@ -0,0 +1,372 @@
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from aggregates import rebuild_daily_terms, rebuild_term_baseline
+
+logger = logging.getLogger(__name__)
+
+# Marker step: VACUUM cannot run inside a transaction, so it is deferred until
+# the migration that requests it has committed.
+VACUUM = "VACUUM"
+
+# Ordered schema migrations: (version, description, steps). A step is either a
+# SQL statement or a callable taking the connection. Each migration runs in its
+# own transaction together with its schema_version row, so a failed upgrade
+# leaves the database at the previous version. Never edit a released migration;
+# append a new one instead.
+MIGRATIONS = [
+    (1, "Create chat_messages", [
+        '''
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            username TEXT NOT NULL,
+            channel_id TEXT NOT NULL,
+            channel_name TEXT NOT NULL,
+            message_content TEXT NOT NULL
+        )
+        ''',
+    ]),
+    (2, "Index chat_messages by timestamp, channel and user", [
+        "CREATE INDEX IF NOT EXISTS idx_chat_messages_timestamp ON chat_messages (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_chat_messages_channel_ts ON chat_messages (channel_name, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_chat_messages_user_ts ON chat_messages (user_id, timestamp)",
+    ]),
+    (3, "Add hourly activity rollups by user and channel", [
+        '''
+        CREATE TABLE activity_user_hourly (
+            hour INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            username TEXT NOT NULL,
+            message_count INTEGER NOT NULL,
+            PRIMARY KEY (hour, user_id)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE activity_channel_hourly (
+            hour INTEGER NOT NULL,
+            channel_name TEXT NOT NULL,
+            message_count INTEGER NOT NULL,
+            PRIMARY KEY (hour, channel_name)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER chat_messages_activity_rollup AFTER INSERT ON chat_messages
+        BEGIN
+            INSERT INTO activity_user_hourly (hour, user_id, username, message_count)
+            VALUES (CAST(strftime('%s', substr(NEW.timestamp, 1, 19)) AS INTEGER) / 3600, NEW.user_id, NEW.username, 1)
+            ON CONFLICT (hour, user_id) DO UPDATE SET
+                message_count = message_count + 1,
+                username = excluded.username;
+            INSERT INTO activity_channel_hourly (hour, channel_name, message_count)
+            VALUES (CAST(strftime('%s', substr(NEW.timestamp, 1, 19)) AS INTEGER) / 3600, NEW.channel_name, 1)
+            ON CONFLICT (hour, channel_name) DO UPDATE SET message_count = message_count + 1;
+        END
+        ''',
+        '''
+        INSERT INTO activity_user_hourly (hour, user_id, username, message_count)
+        SELECT hour, user_id, username, message_count FROM (
+            SELECT CAST(strftime('%s', substr(timestamp, 1, 19)) AS INTEGER) / 3600 AS hour,
+                   user_id, username, COUNT(*) AS message_count, MAX(id)
+            FROM chat_messages
+            GROUP BY hour, user_id
+        )
+        ''',
+        '''
+        INSERT INTO activity_channel_hourly (hour, channel_name, message_count)
+        SELECT CAST(strftime('%s', substr(timestamp, 1, 19)) AS INTEGER) / 3600 AS hour,
+               channel_name, COUNT(*)
+        FROM chat_messages
+        GROUP BY hour, channel_name
+        ''',
+    ]),
+    (4, "Normalize chat log storage into messages, users and channels", [
+        '''
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE user_names (
+            user_id INTEGER NOT NULL,
+            first_seen INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            PRIMARY KEY (user_id, first_seen)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE channels (
+            channel_id INTEGER PRIMARY KEY,
+            channel_name TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE channel_names (
+            channel_id INTEGER NOT NULL,
+            first_seen INTEGER NOT NULL,
+            channel_name TEXT NOT NULL,
+            PRIMARY KEY (channel_id, first_seen)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            content TEXT NOT NULL
+        )
+        ''',
+        # Copy history, keeping message ids and converting ISO-8601 text to epoch seconds
+        '''
+        INSERT INTO messages (id, ts, user_id, channel_id, content)
+        SELECT id, CAST(strftime('%s', substr(timestamp, 1, 19)) AS INTEGER),
+               CAST(user_id AS INTEGER), CAST(channel_id AS INTEGER), message_content
+        FROM chat_messages
+        ORDER BY id
+        ''',
+        # Current names are the ones on each user's/channel's latest message
+        '''
+        INSERT INTO users (user_id, username)
+        SELECT user_id, username FROM (
+            SELECT CAST(user_id AS INTEGER) AS user_id, username, MAX(id)
+            FROM chat_messages
+            GROUP BY user_id
+        )
+        ''',
+        '''
+        INSERT INTO channels (channel_id, channel_name)
+        SELECT channel_id, channel_name FROM (
+            SELECT CAST(channel_id AS INTEGER) AS channel_id, channel_name, MAX(id)
+            FROM chat_messages
+            GROUP BY channel_id
+        )
+        ''',
+        # Name history: one row per change, stamped with the first message under the new name
+        '''
+        INSERT OR IGNORE INTO user_names (user_id, first_seen, username)
+        SELECT user_id, ts, username FROM (
+            SELECT m.user_id, m.ts, c.username,
+                   LAG(c.username) OVER (PARTITION BY m.user_id ORDER BY m.id) AS previous
+            FROM chat_messages c JOIN messages m ON m.id = c.id
+        )
+        WHERE previous IS NULL OR previous != username
+        ''',
+        '''
+        INSERT OR IGNORE INTO channel_names (channel_id, first_seen, channel_name)
+        SELECT channel_id, ts, channel_name FROM (
+            SELECT m.channel_id, m.ts, c.channel_name,
+                   LAG(c.channel_name) OVER (PARTITION BY m.channel_id ORDER BY m.id) AS previous
+            FROM chat_messages c JOIN messages m ON m.id = c.id
+        )
+        WHERE previous IS NULL OR previous != channel_name
+        ''',
+        "DROP TRIGGER chat_messages_activity_rollup",
+        "DROP TABLE activity_user_hourly",
+        "DROP TABLE activity_channel_hourly",
+        "DROP TABLE chat_messages",
+        "CREATE INDEX idx_messages_ts ON messages (ts)",
+        "CREATE INDEX idx_messages_channel_ts ON messages (channel_id, ts)",
+        "CREATE INDEX idx_messages_user_ts ON messages (user_id, ts)",
+        # Compatibility view with the old chat_messages columns; names are the
+        # ones in effect when each message was sent
+        '''
+        CREATE VIEW chat_messages AS
+        SELECT m.id AS id,
+               strftime('%Y-%m-%dT%H:%M:%S+00:00', m.ts, 'unixepoch') AS timestamp,
+               CAST(m.user_id AS TEXT) AS user_id,
+               COALESCE((SELECT n.username FROM user_names n
+                         WHERE n.user_id = m.user_id AND n.first_seen <= m.ts
+                         ORDER BY n.first_seen DESC LIMIT 1), u.username) AS username,
+               CAST(m.channel_id AS TEXT) AS channel_id,
+               COALESCE((SELECT n.channel_name FROM channel_names n
+                         WHERE n.channel_id = m.channel_id AND n.first_seen <= m.ts
+                         ORDER BY n.first_seen DESC LIMIT 1), c.channel_name) AS channel_name,
+               m.content AS message_content
+        FROM messages m
+        LEFT JOIN users u ON u.user_id = m.user_id
+        LEFT JOIN channels c ON c.channel_id = m.channel_id
+        ''',
+        '''
+        CREATE TABLE activity_user_hourly (
+            hour INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            PRIMARY KEY (hour, user_id)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE activity_channel_hourly (
+            hour INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            PRIMARY KEY (hour, channel_id)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER messages_activity_rollup AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO activity_user_hourly (hour, user_id, message_count)
+            VALUES (NEW.ts / 3600, NEW.user_id, 1)
+            ON CONFLICT (hour, user_id) DO UPDATE SET message_count = message_count + 1;
+            INSERT INTO activity_channel_hourly (hour, channel_id, message_count)
+            VALUES (NEW.ts / 3600, NEW.channel_id, 1)
+            ON CONFLICT (hour, channel_id) DO UPDATE SET message_count = message_count + 1;
+        END
+        ''',
+        '''
+        INSERT INTO activity_user_hourly (hour, user_id, message_count)
+        SELECT ts / 3600 AS hour, user_id, COUNT(*) FROM messages GROUP BY hour, user_id
+        ''',
+        '''
+        INSERT INTO activity_channel_hourly (hour, channel_id, message_count)
+        SELECT ts / 3600 AS hour, channel_id, COUNT(*) FROM messages GROUP BY hour, channel_id
+        ''',
+        VACUUM,
+    ]),
+    (5, "Enable incremental auto-vacuum", [
+        "PRAGMA auto_vacuum = INCREMENTAL",
+        VACUUM,
+    ]),
+    (6, "Add FTS5 full-text index over message content", [
+        '''
+        CREATE VIRTUAL TABLE messages_fts USING fts5(
+            content,
+            content='messages',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO messages_fts (rowid, content) VALUES (NEW.id, NEW.content);
+        END
+        ''',
+        '''
+        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages
+        BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+        END
+        ''',
+        '''
+        CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages
+        BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+            INSERT INTO messages_fts (rowid, content) VALUES (NEW.id, NEW.content);
+        END
+        ''',
+        # Backfill the index from existing messages
+        "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')",
+    ]),
+    (7, "Add daily word and bigram counts for topic analysis", [
+        '''
+        CREATE TABLE daily_words (
+            day INTEGER NOT NULL,
+            word TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, word)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE daily_bigrams (
+            day INTEGER NOT NULL,
+            bigram TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, bigram)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE daily_topic_messages (
+            day INTEGER PRIMARY KEY,
+            message_count INTEGER NOT NULL
+        )
+        ''',
+        rebuild_daily_terms,
+    ]),
+    (8, "Add per-day heavy-hitter sketches for approximate term stats", [
+        '''
+        CREATE TABLE daily_term_sketches (
+            kind TEXT NOT NULL,
+            capacity INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            sketch BLOB NOT NULL,
+            PRIMARY KEY (kind, capacity, day)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (9, "Add rolling document-frequency baseline for topic scoring", [
+        '''
+        CREATE TABLE term_baseline (
+            word TEXT PRIMARY KEY,
+            days INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        "CREATE TABLE baseline_days (day INTEGER PRIMARY KEY)",
+        rebuild_term_baseline,
+    ]),
+    (10, "Add persistent !ask response cache", [
+        '''
+        CREATE TABLE ask_cache (
+            key TEXT PRIMARY KEY,
+            question TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            expires_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX idx_ask_cache_expires ON ask_cache (expires_at)",
+    ]),
+]
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for a fresh database)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn):
+    """Bring the database up to the latest schema version in place."""
+    current = get_schema_version(conn)
+    conn.commit()
+
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info("Applying schema migration %d: %s", version, description)
+        try:
+            conn.execute("BEGIN")
+            for step in steps:
+                if step == VACUUM:
+                    continue
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.now(timezone.utc).isoformat())
+            )
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            logger.critical("Schema migration %d failed, database left at version %d",
+                            version, current, exc_info=True)
+            raise
+        current = version
+
+        if VACUUM in steps:
+            logger.info("Vacuuming database after schema migration %d", version)
+            conn.execute("VACUUM")
+
+    return current
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import time
+from config import ASK_CACHE_MEMORY_SIZE, ASK_CACHE_TTL_SECONDS, CHAT_DB_PATH
+from db import get_database
+from utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD_RE = re.compile(r'[^\w\s]+')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_question(question):
+    """Fold case, punctuation and spacing so trivially different phrasings share an entry."""
+    return _SPACE_RE.sub(' ', _NON_WORD_RE.sub(' ', question.lower())).strip()
+
+
+class ResponseCache:
+    """Two-tier cache of LLM answers: an in-memory LRU in front of a SQLite table.
+
+    Entries are keyed on the model, system prompt and normalized question and
+    expire after `ttl` seconds. Expired rows are ignored on lookup and
+    deleted by purge_expired() (run nightly).
+    """
+
+    def __init__(self, db_path=CHAT_DB_PATH, memory_size=ASK_CACHE_MEMORY_SIZE, ttl=ASK_CACHE_TTL_SECONDS):
+        self.db = get_database(db_path)
+        self.ttl = ttl
+        self._memory = LRUCache(memory_size)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model, system_prompt, question):
+        payload = json.dumps([model, system_prompt, normalize_question(question)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for key, or None if absent or expired."""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None and entry[1] > now:
+            self.memory_hits += 1
+            return entry[0]
+
+        try:
+            row = self.db.reader().execute(
+                "SELECT response, expires_at FROM ask_cache WHERE key = ? AND expires_at > ?",
+                (key, int(now))
+            ).fetchone()
+        except sqlite3.Error:
+            logger.warning("Error reading the response cache", exc_info=True)
+            row = None
+        if row is None:
+            self._memory.pop(key)
+            self.misses += 1
+            return None
+        self._memory.put(key, row)
+        self.disk_hits += 1
+        return row[0]
+
+    def put(self, key, question, response):
+        expires_at = int(time.time()) + self.ttl
+        self._memory.put(key, (response, expires_at))
+        try:
+            with self.db.write() as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO ask_cache (key, question, response, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, question, response, int(time.time()), expires_at)
+                )
+        except sqlite3.Error:
+            logger.warning("Error writing the response cache", exc_info=True)
+
+    def purge(self):
+        """Drop every cached response. Returns the number of stored entries removed."""
+        self._memory.clear()
+        with self.db.write() as conn, conn:
+            removed = conn.execute("DELETE FROM ask_cache").rowcount
+        logger.info("Purged %d cached responses", removed)
+        return removed
+
+    def purge_expired(self):
+        """Delete expired rows from the SQLite tier. Returns the number removed."""
+        with self.db.write() as conn, conn:
+            return conn.execute("DELETE FROM ask_cache WHERE expires_at <= ?", (int(time.time()),)).rowcount
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_entries': len(self._memory),
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
@@ -6,6 +6,7 @@ from datetime import timedelta
 
 import discord
 
+from channel_registry import ChannelRegistry
 from config import (
     AUTHORIZED_USERS,
     SPAM_CHANNEL_THRESHOLD,
@@ -28,8 +29,9 @@ class SpamDetector:
     """Detects cross-channel spam by tracking how many distinct channels
     a user posts in within a sliding time window."""
 
-    def __init__(self, client: discord.Client):
+    def __init__(self, client: discord.Client, channels: ChannelRegistry):
         self._client = client
+        self._channels = channels
         self._channel_threshold = SPAM_CHANNEL_THRESHOLD
         self._time_window = SPAM_TIME_WINDOW_SECONDS
         self._timeout_minutes = SPAM_TIMEOUT_MINUTES
@@ -171,18 +173,17 @@ class SpamDetector:
         total_messages: int, deleted_count: int,
     ) -> None:
         """Send a notification to the moderator channel."""
-        for guild in self._client.guilds:
-            for channel in guild.text_channels:
-                if channel.name == SPAM_NOTIFY_CHANNEL:
-                    try:
-                        await channel.send(
-                            f"**Spam Detected**\n"
-                            f"User: {member.mention} ({member.name})\n"
-                            f"Channels: {channel_count} channels in {self._time_window}s\n"
-                            f"Messages deleted: {deleted_count}/{total_messages}\n"
-                            f"Action: Timed out for {self._timeout_minutes} minutes"
-                        )
-                    except discord.HTTPException as e:
-                        logger.error("Failed to send spam notification: %s", e)
-                    return
-        logger.warning("Could not find '%s' channel to send spam notification", SPAM_NOTIFY_CHANNEL)
+        channel = self._channels.get(member.guild, SPAM_NOTIFY_CHANNEL) or self._channels.find(SPAM_NOTIFY_CHANNEL)
+        if channel is None:
+            logger.warning("Could not find '%s' channel to send spam notification", SPAM_NOTIFY_CHANNEL)
+            return
+        try:
+            await channel.send(
+                f"**Spam Detected**\n"
+                f"User: {member.mention} ({member.name})\n"
+                f"Channels: {channel_count} channels in {self._time_window}s\n"
+                f"Messages deleted: {deleted_count}/{total_messages}\n"
+                f"Action: Timed out for {self._timeout_minutes} minutes"
+            )
+        except discord.HTTPException as e:
+            logger.error("Failed to send spam notification: %s", e)
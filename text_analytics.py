@@ -0,0 +1,112 @@
+"""Tokenization and term statistics shared by chat logging and reports.
+
+All patterns are compiled once at import. A single regex scan per message both
+skips noise (URLs, mentions, bot commands) and extracts words, instead of three
+re.sub() passes followed by re.findall() over one giant joined string.
+"""
+import math
+import re
+from collections import Counter
+
+# One alternation: noise is matched (and discarded) before it can yield words;
+# only the word branch has a capturing group, so findall() returns '' for noise.
+_TOKEN_RE = re.compile(r'https?://\S+|<@!?\d+>|!\w+|\b([a-z]{3,})\b')
+
+# Common stop words to filter out
+STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'been',
+    'be', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those',
+    'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them',
+    'my', 'your', 'his', 'its', 'our', 'their', 'am', 'im', 'dont', 'doesnt',
+    'not', 'no', 'yes', 'like', 'just', 'get', 'got', 'about', 'so', 'what',
+    'when', 'where', 'who', 'how', 'why', 'if', 'then', 'than', 'some', 'any',
+    'all', 'both', 'each', 'few', 'more', 'most', 'other', 'such', 'only', 'own',
+    'same', 'than', 'too', 'very', 'one', 'two', 'three', 'lol', 'lmao', 'yeah',
+    'ok', 'okay', 'thanks', 'thank', 'thats', 'its', 'youre', 'theyre', 'ive',
+    'haha', 'oh', 'well', 'also', 'now', 'see', 'know', 'think', 'want', 'need'
+})
+
+# Noise and stop words both filter out of the same lookup
+_DISCARD = STOP_WORDS | {''}
+
+
+def tokenize(text):
+    """Return the meaningful words (3+ letters, not stop words) in one message."""
+    return [w for w in _TOKEN_RE.findall(text.lower()) if w not in _DISCARD]
+
+
+def format_topic(top_words):
+    """Turn up to three (word, count) pairs into a topic name."""
+    top_words = top_words[:3]
+    if not top_words:
+        return "General discussion"
+    if len(top_words) == 1:
+        return top_words[0][0].capitalize()
+    elif len(top_words) == 2:
+        return f"{top_words[0][0].capitalize()} and {top_words[1][0]}"
+    return f"{top_words[0][0].capitalize()}, {top_words[1][0]}, and {top_words[2][0]}"
+
+
+def rank_distinctive(word_counts, doc_freq, total_docs, n=30):
+    """Re-rank (word, count) candidates by TF-IDF against a day-level baseline.
+
+    doc_freq maps a word to the number of baseline days it appeared on, out
+    of total_docs. Everyday server vocabulary (present most days) is pushed
+    down in favour of words unusual for the period. Returns the top n as
+    (word, count) pairs; with no baseline the input order is kept.
+    """
+    if not total_docs:
+        return list(word_counts[:n])
+    # Sublinear TF so sheer volume cannot swamp rarity; smoothed IDF so a word
+    # seen on every baseline day still keeps a little weight
+    scores = [
+        (1 + math.log(count)) * (math.log((1 + total_docs) / (1 + doc_freq.get(word, 0))) + 1)
+        for word, count in word_counts
+    ]
+    order = sorted(range(len(word_counts)), key=scores.__getitem__, reverse=True)
+    return [word_counts[i] for i in order[:n]]
+
+
+class TermCounter:
+    """Single-pass word and bigram counts over a stream of messages."""
+
+    def __init__(self):
+        self.words = Counter()
+        self.bigrams = Counter()
+        self.message_count = 0
+
+    def add(self, text):
+        """Tokenize one message and add its words and bigrams. Returns the tokens."""
+        words = tokenize(text)
+        self.words.update(words)
+        self.bigrams.update(zip(words, words[1:]))
+        self.message_count += 1
+        return words
+
+    def top_words(self, n=30):
+        return self.words.most_common(n)
+
+    def top_bigrams(self, n=20):
+        return [(f"{a} {b}", count) for (a, b), count in self.bigrams.most_common(n)]
+
+    def topic(self):
+        """Rule-based topic name from the three most frequent words."""
+        return format_topic(self.top_words(3))
+
+
+def analyze(messages, top_words=30, top_bigrams=20):
+    """Words, bigrams and topic for an iterable of messages in one pass.
+
+    Returns {'words', 'bigrams', 'topic', 'message_count'}.
+    """
+    counter = TermCounter()
+    for text in messages:
+        counter.add(text)
+    return {
+        'words': counter.top_words(top_words),
+        'bigrams': counter.top_bigrams(top_bigrams),
+        'topic': counter.topic(),
+        'message_count': counter.message_count,
+    }
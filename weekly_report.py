@@ -1,212 +1,535 @@
+import asyncio
 import logging
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 from collections import Counter
-import re
-from config import EXCLUDED_CHANNELS_FROM_TOPIC
+from aggregates import SECONDS_PER_DAY, build_day_sketch
+from chat_archive import ChatArchiver
+from config import (
+    CHAT_DB_PATH,
+    EXCLUDED_CHANNELS_FROM_TOPIC,
+    REPORT_APPROXIMATE_AFTER_DAYS,
+    REPORT_CACHE_SIZE,
+    REPORT_FETCH_SIZE,
+    REPORT_TIMEOUT_SECONDS,
+    TERM_SKETCH_CAPACITY,
+    TOPIC_CANDIDATES,
+)
+from db import get_database
+from heavy_hitters import SpaceSaving
+from llm_scheduler import PRIORITY_REPORT
+from text_analytics import TermCounter, format_topic, rank_distinctive
+from utils import LRUCache
 
 logger = logging.getLogger(__name__)
 
+class ReportCancelled(Exception):
+    """Raised inside a report computation when it has been cancelled."""
+
+
+@dataclass
+class ReportProgress:
+    state: str = "idle"              # idle, running, done, failed, cancelled
+    stage: str = ""                  # activity, terms
+    rows_processed: int = 0
+    rows_expected: int = 0           # Upper bound taken from the activity rollups
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+
 class WeeklyReport:
-    def __init__(self, db_path='chat_logs.db'):
+    def __init__(self, db_path=CHAT_DB_PATH):
         self.db_path = db_path
-
-    def get_weekly_stats(self):
-        """Get statistics for the last 7 days."""
-        seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+        self.db = get_database(db_path)
+        # Reports run on one dedicated thread, which also gives them their own read connection
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="weekly-report")
+        self._inflight = None
+        self._inflight_window = None
+        self._cancel_event = threading.Event()
+        self.progress = ReportProgress()
+        self.archiver = ChatArchiver(db_path)
+        # Results of get_cached_report_stats(), keyed by window, scope and data watermark
+        self._cache = LRUCache(REPORT_CACHE_SIZE)
+        # AI topics keyed by (start, end, watermark), and the last full report per window
+        self._topic_cache = LRUCache(REPORT_CACHE_SIZE)
+        self._latest_reports = LRUCache(REPORT_CACHE_SIZE)
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    async def get_weekly_stats_async(self, start=None, end=None, timeout=REPORT_TIMEOUT_SECONDS):
+        """Compute weekly stats on the report thread without blocking the event loop.
+
+        The window defaults to the 7 days up to now, starting on an hour
+        boundary so it can be served from the report cache. Concurrent callers
+        for the same window share the computation already in flight. If it
+        does not finish within `timeout` seconds it is cancelled. Returns None
+        on failure, timeout or cancellation.
+        """
+        if start is None:
+            start = self.weekly_window_start()
+        window = (start, end)
+        if self._inflight is None or self._inflight.done() or self._inflight_window != window:
+            self._cancel_event = threading.Event()
+            self.progress = ReportProgress(state="running", started_at=time.monotonic())
+            loop = asyncio.get_running_loop()
+            self._inflight_window = window
+            self._inflight = loop.run_in_executor(
+                self._executor, self._run_report, start, end, self.progress, self._cancel_event
+            )
+        else:
+            logger.info("Joining weekly report already in progress")
 
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-
-                # Get all messages from the last 7 days
-                cursor.execute('''
-                    SELECT user_id, username, message_content, channel_name
-                    FROM chat_messages
-                    WHERE timestamp >= ?
-                    ORDER BY timestamp DESC
-                ''', (seven_days_ago,))
-
-                messages = cursor.fetchall()
-
-                if not messages:
-                    return {
-                        'total_messages': 0,
-                        'top_chatter': None,
-                        'top_chatter_id': None,
-                        'top_chatter_count': 0,
-                        'most_discussed_topic': 'No messages this week',
-                        'most_active_channel': None,
-                        'most_active_channel_count': 0,
-                        'all_messages': []
-                    }
-
-                # Count messages per user and per channel
-                user_message_counts = Counter()
-                user_id_to_username = {}
-                channel_message_counts = Counter()
-                all_message_contents = []
-
-                for msg in messages:
-                    user_id = msg['user_id']
-                    user_message_counts[user_id] += 1
-                    user_id_to_username[user_id] = msg['username']
-                    channel_message_counts[msg['channel_name']] += 1
-                    # Exclude certain channels from topic analysis (automated/admin messages skew results)
-                    if msg['channel_name'] not in EXCLUDED_CHANNELS_FROM_TOPIC:
-                        all_message_contents.append(msg['message_content'])
-
-                # Get top chatter (by user_id)
-                top_chatter = user_message_counts.most_common(1)[0] if user_message_counts else (None, 0)
-                top_chatter_id = top_chatter[0]
-                top_chatter_name = user_id_to_username.get(top_chatter_id) if top_chatter_id else None
-
-                # Get most active channel
-                top_channel = channel_message_counts.most_common(1)[0] if channel_message_counts else (None, 0)
-
-                # Get most discussed topic
-                most_discussed_topic = self._extract_most_discussed_topic(all_message_contents)
-
-                return {
-                    'total_messages': len(messages),
-                    'top_chatter': top_chatter_name,
-                    'top_chatter_id': top_chatter_id,
-                    'top_chatter_count': top_chatter[1],
-                    'most_discussed_topic': most_discussed_topic,
-                    'most_active_channel': top_channel[0],
-                    'most_active_channel_count': top_channel[1],
-                    'all_messages': all_message_contents
-                }
-
-        except sqlite3.Error as e:
-            logger.error("Database error in weekly report", exc_info=True)
+            return await asyncio.wait_for(asyncio.shield(self._inflight), timeout)
+        except asyncio.TimeoutError:
+            logger.error("Weekly report timed out after %ss, cancelling", timeout)
+            self.cancel()
             return None
 
-    def _extract_most_discussed_topic(self, messages):
-        """Extract the most discussed topic from messages using keyword analysis."""
-        if not messages:
-            return "No messages"
+    @staticmethod
+    def weekly_window_start(now=None):
+        """Start of the default weekly window: 7 days ago, rounded down to the hour."""
+        now = now if now is not None else time.time()
+        return int(now - 7 * SECONDS_PER_DAY) // 3600 * 3600
 
-        # Combine all messages
-        all_text = ' '.join(messages).lower()
-
-        # Remove common words, URLs, mentions, and commands
-        all_text = re.sub(r'http[s]?://\S+', '', all_text)  # Remove URLs
-        all_text = re.sub(r'<@!?\d+>', '', all_text)  # Remove mentions
-        all_text = re.sub(r'!\w+', '', all_text)  # Remove commands
-
-        # Common stop words to filter out
-        stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-            'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'been',
-            'be', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
-            'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those',
-            'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them',
-            'my', 'your', 'his', 'its', 'our', 'their', 'am', 'im', 'dont', 'doesnt',
-            'not', 'no', 'yes', 'like', 'just', 'get', 'got', 'about', 'so', 'what',
-            'when', 'where', 'who', 'how', 'why', 'if', 'then', 'than', 'some', 'any',
-            'all', 'both', 'each', 'few', 'more', 'most', 'other', 'such', 'only', 'own',
-            'same', 'than', 'too', 'very', 'one', 'two', 'three', 'lol', 'lmao', 'yeah',
-            'ok', 'okay', 'thanks', 'thank', 'thats', 'its', 'youre', 'theyre', 'ive',
-            'haha', 'oh', 'well', 'also', 'now', 'see', 'know', 'think', 'want', 'need'
-        }
+    def _run_report(self, start, end, progress, cancel_event):
+        """Executor entry point: run the report and record its final state."""
+        try:
+            stats = self.get_cached_report_stats(start, end, progress=progress, cancel_event=cancel_event)
+            progress.state = "done" if stats is not None else "failed"
+            return stats
+        except ReportCancelled:
+            logger.warning("Weekly report was cancelled")
+            progress.state = "cancelled"
+            return None
+        finally:
+            progress.finished_at = time.monotonic()
+
+    async def get_weekly_report(self, api_client, start=None, end=None, allow_stale=False):
+        """Weekly stats with the AI topic filled in, memoized on window and watermark.
+
+        The AI topic is only requested once per (window, watermark); a failed
+        request is not memoized and the rule-based topic is kept. With
+        allow_stale=True the last complete report built for the same window
+        is returned as-is if there is one (this is how the scheduled post
+        uses the pre-warmed report without waiting on the database or Groq).
+        A report whose AI topic request failed is not kept for that, so the
+        next call asks Groq again. Returns None on failure.
+        """
+        if start is None:
+            start = self.weekly_window_start()
+        if allow_stale:
+            latest = self._latest_reports.get((start, end))
+            if latest is not None:
+                self.cache_hits += 1
+                return dict(latest)
+
+        stats = await self.get_weekly_stats_async(start, end)
+        if stats is None:
+            return None
 
-        # Extract words (at least 3 characters)
-        words = re.findall(r'\b[a-z]{3,}\b', all_text)
+        key = (start, end, stats['watermark'])
+        topic = self._topic_cache.get(key)
+        wants_topic = stats['total_messages'] > 0 and stats['word_stats']['words']
+        if topic is None and wants_topic:
+            topic = await self._request_ai_topic(api_client, stats)
+            if topic:
+                self._topic_cache.put(key, topic)
+        if topic:
+            stats['most_discussed_topic'] = topic
+
+        if topic or not wants_topic:
+            self._latest_reports.put((start, end), stats)
+        return dict(stats)
+
+    async def get_report_stats_async(self, start, end=None, channel_id=None, user_id=None,
+                                     timeout=REPORT_TIMEOUT_SECONDS):
+        """Run get_cached_report_stats() on the report thread. Returns None on failure or timeout.
+
+        Requests queue behind each other on the report thread, so a repeat of
+        a query still being computed is answered from the cache once it ends.
+        """
+        cancel_event = threading.Event()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor, self._run_cached_report, start, end, channel_id, user_id, cancel_event
+        )
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            logger.error("Report timed out after %ss, cancelling", timeout)
+            cancel_event.set()
+            return None
 
-        # Filter out stop words
-        meaningful_words = [w for w in words if w not in stop_words]
+    def _run_cached_report(self, start, end, channel_id, user_id, cancel_event):
+        try:
+            return self.get_cached_report_stats(start, end, channel_id, user_id, cancel_event=cancel_event)
+        except ReportCancelled:
+            logger.warning("Report was cancelled")
+            return None
 
-        if not meaningful_words:
-            return "General discussion"
+    def cancel(self):
+        """Cancel the report in flight, if any. Returns True if one was running."""
+        if self._inflight is None or self._inflight.done():
+            return False
+        self._cancel_event.set()
+        return True
+
+    def close(self):
+        """Cancel any running report and shut down the report thread."""
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_weekly_stats(self, progress=None, cancel_event=None):
+        """Get statistics for the last 7 days.
+
+        This blocks; from the event loop use get_weekly_stats_async(). If given,
+        `progress` is updated per stage and `cancel_event` is checked between
+        stages (raising ReportCancelled).
+        """
+        since = int((datetime.now(timezone.utc) - timedelta(days=7)).timestamp())
+        return self.get_report_stats(since, progress=progress, cancel_event=cancel_event)
+
+    def get_watermark(self, conn=None):
+        """Highest logged message id: changes exactly when new messages land."""
+        conn = conn or self.db.reader()
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+
+    def get_cached_report_stats(self, start, end=None, channel_id=None, user_id=None,
+                                progress=None, cancel_event=None):
+        """get_report_stats() through an LRU cache keyed by window, scope and watermark.
+
+        A repeated query is answered from memory until new messages are
+        logged. The stats include the 'watermark' they were computed at.
+        Returns a copy the caller may modify, or None on failure.
+        """
+        try:
+            watermark = self.get_watermark()
+        except sqlite3.Error:
+            logger.error("Database error reading report watermark", exc_info=True)
+            return None
 
-        # Count word frequency
-        word_counts = Counter(meaningful_words)
+        key = (start, end, channel_id, user_id, watermark)
+        stats = self._cache.get(key)
+        if stats is not None:
+            self.cache_hits += 1
+            return dict(stats)
+
+        self.cache_misses += 1
+        stats = self.get_report_stats(start, end, channel_id, user_id, progress=progress, cancel_event=cancel_event)
+        if stats is not None:
+            stats['watermark'] = watermark
+            self._cache.put(key, stats)
+            return dict(stats)
+        return None
+
+    def clear_cache(self):
+        """Drop cached report results (after aggregates are rebuilt)."""
+        self._cache.clear()
+        self._topic_cache.clear()
+        self._latest_reports.clear()
+
+    def cache_stats(self):
+        return {
+            'size': len(self._cache),
+            'capacity': self._cache.max_size,
+            'topics': len(self._topic_cache),
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+        }
 
-        # Get top 3 most common words
-        top_words = word_counts.most_common(3)
+    def get_report_stats(self, start, end=None, channel_id=None, user_id=None,
+                         progress=None, cancel_event=None):
+        """Get statistics for messages with start <= ts < end (epoch seconds; end defaults to now).
 
-        if not top_words:
-            return "General discussion"
+        Unscoped reports read the hourly activity rollups and daily word and
+        bigram counts built at log time, so the window is widened to whole
+        hours and days (the partial day at the start is included). Windows
+        longer than REPORT_APPROXIMATE_AFTER_DAYS use approximate term stats.
 
-        # Format the topic based on top words
-        if len(top_words) == 1:
-            return top_words[0][0].capitalize()
-        elif len(top_words) == 2:
-            return f"{top_words[0][0].capitalize()} and {top_words[1][0]}"
-        else:
-            return f"{top_words[0][0].capitalize()}, {top_words[1][0]}, and {top_words[2][0]}"
-
-    def _extract_word_stats(self, messages):
-        """Extract word and bigram frequencies from ALL messages for AI analysis."""
-        if not messages:
-            return {'words': [], 'bigrams': []}
-
-        # Combine all messages
-        all_text = ' '.join(messages).lower()
-
-        # Remove URLs, mentions, and commands
-        all_text = re.sub(r'http[s]?://\S+', '', all_text)
-        all_text = re.sub(r'<@!?\d+>', '', all_text)
-        all_text = re.sub(r'!\w+', '', all_text)
-
-        # Common stop words to filter out
-        stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-            'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'been',
-            'be', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
-            'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those',
-            'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them',
-            'my', 'your', 'his', 'its', 'our', 'their', 'am', 'im', 'dont', 'doesnt',
-            'not', 'no', 'yes', 'like', 'just', 'get', 'got', 'about', 'so', 'what',
-            'when', 'where', 'who', 'how', 'why', 'if', 'then', 'than', 'some', 'any',
-            'all', 'both', 'each', 'few', 'more', 'most', 'other', 'such', 'only', 'own',
-            'same', 'than', 'too', 'very', 'one', 'two', 'three', 'lol', 'lmao', 'yeah',
-            'ok', 'okay', 'thanks', 'thank', 'thats', 'its', 'youre', 'theyre', 'ive',
-            'haha', 'oh', 'well', 'also', 'now', 'see', 'know', 'think', 'want', 'need'
-        }
+        Reports scoped to a channel and/or user stream the matching messages
+        (including archived ones) through the indexes instead.
 
-        # Extract words (at least 3 characters)
-        words = re.findall(r'\b[a-z]{3,}\b', all_text)
-        meaningful_words = [w for w in words if w not in stop_words]
+        Blocks. Returns None on a database error.
+        """
+        progress = progress or ReportProgress()
+        progress.stage = "activity"
 
-        # Count single word frequency
-        word_counts = Counter(meaningful_words)
+        try:
+            conn = self.db.reader()
+            if channel_id is not None or user_id is not None:
+                return self._get_scoped_stats(conn, start, end, channel_id, user_id, progress, cancel_event)
+
+            end_hour = -(-end // 3600) if end is not None else 2 ** 62
+            start_hour = start // 3600
+
+            # Most active channel and total message count from the channel rollup
+            channel_counts = conn.execute('''
+                SELECT r.channel_id, c.channel_name, SUM(r.message_count) AS total
+                FROM activity_channel_hourly r
+                LEFT JOIN channels c ON c.channel_id = r.channel_id
+                WHERE r.hour >= ? AND r.hour < ?
+                GROUP BY r.channel_id
+                ORDER BY total DESC
+            ''', (start_hour, end_hour)).fetchall()
+            total_messages = sum(row[2] for row in channel_counts)
+
+            if not total_messages:
+                return self._empty_stats()
+
+            top_channel = channel_counts[0]
+            progress.rows_expected = total_messages
+
+            # Top chatter (by user_id)
+            top_chatter = conn.execute('''
+                SELECT r.user_id, u.username, SUM(r.message_count) AS total
+                FROM activity_user_hourly r
+                LEFT JOIN users u ON u.user_id = r.user_id
+                WHERE r.hour >= ? AND r.hour < ?
+                GROUP BY r.user_id
+                ORDER BY total DESC
+                LIMIT 1
+            ''', (start_hour, end_hour)).fetchone()
+
+            # Topic analysis input: merge the daily word/bigram aggregates
+            if cancel_event is not None and cancel_event.is_set():
+                raise ReportCancelled()
+            progress.stage = "terms"
+            start_day = start // SECONDS_PER_DAY
+            end_day = (end - 1) // SECONDS_PER_DAY if end is not None else None
+            days = (end if end is not None else time.time()) / SECONDS_PER_DAY - start_day
+            term_stats = self.get_term_stats(start_day, end_day, words=TOPIC_CANDIDATES, conn=conn,
+                                             approximate=days > REPORT_APPROXIMATE_AFTER_DAYS)
+            progress.rows_processed = term_stats['message_count']
+            distinctive = self._distinctive_words(conn, term_stats['words'])
+
+            return {
+                'total_messages': total_messages,
+                'top_chatter': top_chatter[1],
+                'top_chatter_id': top_chatter[0],
+                'top_chatter_count': top_chatter[2],
+                'most_discussed_topic': self._extract_most_discussed_topic(distinctive, term_stats['message_count']),
+                'most_active_channel': top_channel[1],
+                'most_active_channel_count': top_channel[2],
+                'topic_message_count': term_stats['message_count'],
+                'word_stats': {'words': term_stats['words'][:30], 'bigrams': term_stats['bigrams'],
+                               'distinctive': distinctive}
+            }
 
-        # Extract bigrams (two-word phrases) from meaningful words
-        bigrams = []
-        for i in range(len(meaningful_words) - 1):
-            bigram = f"{meaningful_words[i]} {meaningful_words[i+1]}"
-            bigrams.append(bigram)
+        except sqlite3.Error as e:
+            logger.error("Database error in report", exc_info=True)
+            return None
 
-        bigram_counts = Counter(bigrams)
+    def _empty_stats(self):
+        return {
+            'total_messages': 0,
+            'top_chatter': None,
+            'top_chatter_id': None,
+            'top_chatter_count': 0,
+            'most_discussed_topic': 'No messages this week',
+            'most_active_channel': None,
+            'most_active_channel_count': 0,
+            'topic_message_count': 0,
+            'word_stats': {'words': [], 'bigrams': [], 'distinctive': []}
+        }
 
+    def _get_scoped_stats(self, conn, start, end, channel_id, user_id, progress, cancel_event):
+        """Report statistics for one channel and/or user, counted from the messages themselves."""
+        end = end if end is not None else int(time.time()) + 1
+        excluded = sorted(EXCLUDED_CHANNELS_FROM_TOPIC)
+        excluded_ids = {row[0] for row in conn.execute(
+            f"SELECT channel_id FROM channels WHERE channel_name IN ({', '.join('?' * len(excluded))})",
+            excluded
+        )}
+
+        progress.stage = "messages"
+        users = Counter()
+        channels = Counter()
+        terms = TermCounter()
+        total = 0
+        for _, _, msg_user_id, msg_channel_id, content in self.archiver.iter_messages(
+                start, end, conn, channel_id=channel_id, user_id=user_id):
+            users[msg_user_id] += 1
+            channels[msg_channel_id] += 1
+            if msg_channel_id not in excluded_ids:
+                terms.add(content or '')
+            total += 1
+            if total % REPORT_FETCH_SIZE == 0:
+                progress.rows_processed = total
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ReportCancelled()
+        progress.rows_processed = total
+
+        if not total:
+            return self._empty_stats()
+
+        top_user_id, top_user_count = users.most_common(1)[0]
+        top_channel_id, top_channel_count = channels.most_common(1)[0]
+        username = conn.execute("SELECT username FROM users WHERE user_id = ?", (top_user_id,)).fetchone()
+        channel_name = conn.execute(
+            "SELECT channel_name FROM channels WHERE channel_id = ?", (top_channel_id,)
+        ).fetchone()
+        candidates = terms.top_words(TOPIC_CANDIDATES)
+        distinctive = self._distinctive_words(conn, candidates)
         return {
-            'words': word_counts.most_common(30),
-            'bigrams': bigram_counts.most_common(20)
+            'total_messages': total,
+            'top_chatter': username[0] if username else None,
+            'top_chatter_id': top_user_id,
+            'top_chatter_count': top_user_count,
+            'most_discussed_topic': self._extract_most_discussed_topic(distinctive, terms.message_count),
+            'most_active_channel': channel_name[0] if channel_name else None,
+            'most_active_channel_count': top_channel_count,
+            'topic_message_count': terms.message_count,
+            'word_stats': {'words': candidates[:30], 'bigrams': terms.top_bigrams(), 'distinctive': distinctive}
         }
 
-    async def generate_report_with_ai(self, api_client, messages):
-        """Use AI to analyze word frequency stats from ALL messages to identify the most discussed topic."""
-        if not messages:
-            return "No messages this week"
+    def _distinctive_words(self, conn, candidates, n=30):
+        """Re-rank candidate (word, count) pairs by TF-IDF against the rolling baseline."""
+        total_docs = conn.execute("SELECT COUNT(*) FROM baseline_days").fetchone()[0]
+        if not total_docs or not candidates:
+            return list(candidates[:n])
+        words = [word for word, _ in candidates]
+        doc_freq = dict(conn.execute(
+            f"SELECT word, days FROM term_baseline WHERE word IN ({', '.join('?' * len(words))})", words
+        ))
+        return rank_distinctive(candidates, doc_freq, total_docs, n)
+
+    def get_term_stats(self, start_day, end_day=None, words=30, bigrams=20, conn=None,
+                       approximate=False, capacity=TERM_SKETCH_CAPACITY):
+        """Top words and bigrams for UTC days start_day..end_day (inclusive; epoch days).
+
+        Merges the daily aggregates written at log time, so the cost depends
+        on the number of days and distinct terms, not on message volume.
+        Returns {'words': [(word, count)], 'bigrams': [(bigram, count)], 'message_count': n,
+        'approximate': bool}.
+
+        With approximate=True, per-day Space-Saving sketches of `capacity`
+        terms are merged instead, keeping memory fixed for long windows
+        (months, years). Counts are then upper bounds and the result also has
+        'error_bounds': {'words': {word: max_overcount}, 'bigrams': {...}}
+        and 'max_error': {'words': n, 'bigrams': n}.
+        """
+        conn = conn or self.db.reader()
+        end_day = end_day if end_day is not None else 2 ** 62
+        message_count = conn.execute(
+            "SELECT COALESCE(SUM(message_count), 0) FROM daily_topic_messages WHERE day BETWEEN ? AND ?",
+            (start_day, end_day)
+        ).fetchone()[0]
+
+        if approximate:
+            word_top = self._merged_sketch(conn, 'words', start_day, end_day, capacity)
+            bigram_top = self._merged_sketch(conn, 'bigrams', start_day, end_day, capacity)
+            top_words = word_top.top(words)
+            top_bigrams = bigram_top.top(bigrams)
+            return {
+                'words': [(w, c) for w, c, _ in top_words],
+                'bigrams': [(b, c) for b, c, _ in top_bigrams],
+                'message_count': message_count,
+                'approximate': True,
+                'error_bounds': {
+                    'words': {w: e for w, _, e in top_words},
+                    'bigrams': {b: e for b, _, e in top_bigrams},
+                },
+                'max_error': {'words': word_top.max_error, 'bigrams': bigram_top.max_error},
+            }
+
+        top_words = conn.execute('''
+            SELECT word, SUM(count) AS total
+            FROM daily_words
+            WHERE day BETWEEN ? AND ?
+            GROUP BY word
+            ORDER BY total DESC
+            LIMIT ?
+        ''', (start_day, end_day, words)).fetchall()
+        top_bigrams = conn.execute('''
+            SELECT bigram, SUM(count) AS total
+            FROM daily_bigrams
+            WHERE day BETWEEN ? AND ?
+            GROUP BY bigram
+            ORDER BY total DESC
+            LIMIT ?
+        ''', (start_day, end_day, bigrams)).fetchall()
+        return {'words': top_words, 'bigrams': top_bigrams, 'message_count': message_count,
+                'approximate': False}
+
+    def _merged_sketch(self, conn, kind, start_day, end_day, capacity):
+        """Merge the per-day sketches for a window, building and storing any missing ones.
+
+        Only days before yesterday are stored: later days can still receive
+        messages (write-behind lag across midnight) and are rebuilt each time.
+        """
+        stored = dict(conn.execute('''
+            SELECT day, sketch FROM daily_term_sketches
+            WHERE kind = ? AND capacity = ? AND day BETWEEN ? AND ?
+        ''', (kind, capacity, start_day, end_day)))
+        days = [row[0] for row in conn.execute(
+            "SELECT day FROM daily_topic_messages WHERE day BETWEEN ? AND ? ORDER BY day",
+            (start_day, end_day)
+        )]
+        settled_before = int(time.time()) // SECONDS_PER_DAY - 1
+
+        merged = SpaceSaving(capacity)
+        new_sketches = []
+        for day in days:
+            if day in stored:
+                sketch = SpaceSaving.from_bytes(stored[day])
+            else:
+                sketch = build_day_sketch(conn, kind, day, capacity)
+                if day < settled_before:
+                    new_sketches.append((kind, capacity, day, sketch.to_bytes()))
+            merged.merge(sketch)
+
+        if new_sketches:
+            with self.db.write() as write_conn, write_conn:
+                write_conn.executemany(
+                    "INSERT OR REPLACE INTO daily_term_sketches (kind, capacity, day, sketch) VALUES (?, ?, ?, ?)",
+                    new_sketches
+                )
+            logger.debug("Stored %d %s sketches", len(new_sketches), kind)
+        return merged
+
+    def _extract_most_discussed_topic(self, word_counts, message_count):
+        """Name the most discussed topic from the top (word, count) pairs."""
+        if not message_count:
+            return "No messages"
+        return format_topic(word_counts)
 
-        # Extract word/bigram frequencies from ALL messages
-        stats = self._extract_word_stats(messages)
+    async def generate_report_with_ai(self, api_client, stats):
+        """Use AI to interpret the week's word frequency stats and identify the most discussed topic."""
+        if not stats['topic_message_count']:
+            return "No messages this week"
 
-        if not stats['words']:
+        if not stats['word_stats']['words']:
             return "General discussion"
 
-        # Format stats for AI prompt
-        word_stats = ", ".join([f"{w}({c})" for w, c in stats['words'][:30]])
-        bigram_stats = ", ".join([f'"{b}"({c})' for b, c in stats['bigrams'][:20]]) if stats['bigrams'] else "none"
+        return await self._request_ai_topic(api_client, stats) or "Various topics"
+
+    async def _request_ai_topic(self, api_client, stats):
+        """Ask the LLM to name the topic from the word stats. Returns None if the request fails."""
+        word_stats = stats['word_stats']
+
+        # Format stats for AI prompt: words are ranked by how unusual they are
+        # for this server (TF-IDF against the rolling baseline), not raw count
+        words = word_stats.get('distinctive') or word_stats['words']
+        word_list = ", ".join([f"{w}({c})" for w, c in words[:30]])
+        bigram_list = ", ".join([f'"{b}"({c})' for b, c in word_stats['bigrams'][:20]]) if word_stats['bigrams'] else "none"
 
         prompt = f"""Based on this word frequency data from a Discord server's weekly chat:
 
-Top words (count): {word_stats}
-Top phrases (count): {bigram_stats}
-Total messages analyzed: {len(messages)}
+Most distinctive words this week (count): {word_list}
+Top phrases (count): {bigram_list}
+Total messages analyzed: {stats['topic_message_count']}
 
 Identify the main topic or theme being discussed in 2-5 words. Be specific and concise."""
 
@@ -216,7 +539,7 @@ Identify the main topic or theme being discussed in 2-5 words. Be specific and c
         ]
 
         try:
-            response = await api_client.make_groq_request(ai_messages)
+            response = await api_client.make_groq_request(ai_messages, profile="report_topic", priority=PRIORITY_REPORT)
             if response and len(response) > 0:
                 # Clean up the response
                 topic = response.strip().strip('"\'')
@@ -224,14 +547,19 @@ Identify the main topic or theme being discussed in 2-5 words. Be specific and c
         except Exception as e:
             logger.warning("Error generating AI topic analysis", exc_info=True)
 
-        return "Various topics"
+        return None
+
+    def format_report(self, stats, window=None):
+        """Format the weekly statistics into a readable report.
 
-    def format_report(self, stats):
-        """Format the weekly statistics into a readable report."""
+        `window` titles a !report over another window (e.g. "Last 30 Days in #general").
+        """
         if not stats or stats['total_messages'] == 0:
+            if window:
+                return f"📊 **Report - {window}**\n\nNo messages were logged in this window!"
             return "📊 **Weekly Report**\n\nNo messages were logged this week!"
 
-        report = "📊 **Weekly Report - Last 7 Days**\n\n"
+        report = f"📊 **Report - {window}**\n\n" if window else "📊 **Weekly Report - Last 7 Days**\n\n"
         report += f"💬 **Total Messages:** {stats['total_messages']:,}\n"
 
         if stats.get('top_chatter_id'):
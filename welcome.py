@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import List, Optional
+
+import discord
+
+from channel_registry import ChannelRegistry
+from config import (
+    WELCOME_BATCH_MAX,
+    WELCOME_BATCH_WINDOW,
+    WELCOME_CHANNEL_ID,
+    WELCOME_POOL_SIZE,
+    WELCOME_REFILL_RETRY,
+)
+from llm_scheduler import PRIORITY_BACKGROUND
+from utils import increment_count
+
+logger = logging.getLogger(__name__)
+
+MENTION_SLOT = "{mention}"
+
+TEMPLATE_MESSAGES = [
+    {"role": "system", "content": "You are a grumpy unix administrator who welcomes new users to a Linux discord server."},
+    {"role": "user", "content": (
+        "Talk like an angry unix administrator and make your response short. Welcome new members to the ProLUG "
+        "discord and encourage them to ask questions about linux. Write the exact placeholder {mention} where "
+        "their names go; it may stand for one person or several, so phrase it to fit either. Use the "
+        "placeholder exactly once. Limit the response to two sentences."
+    )},
+]
+
+
+def format_mentions(members: List[discord.Member]) -> str:
+    """'@a', '@a and @b', '@a, @b and @c'."""
+    mentions = [member.mention for member in members]
+    if len(mentions) == 1:
+        return mentions[0]
+    return f"{', '.join(mentions[:-1])} and {mentions[-1]}"
+
+
+def default_welcome(mention: str) -> str:
+    return f"Welcome, {mention}! Feel free to look around and ask any questions."
+
+
+class WelcomePool:
+    """Pre-generated welcome templates with a {mention} slot.
+
+    A background task keeps `size` templates ready, so a welcome can be posted
+    without waiting on the LLM. Each template is used once.
+    """
+
+    def __init__(self, api_client, size: int = WELCOME_POOL_SIZE):
+        self.api_client = api_client
+        self.size = size
+        self._templates = deque()
+        self._wanted = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.generated = 0
+        self.rejected = 0
+        self.served = 0
+        self.fallbacks = 0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wanted.set()
+            self._task = asyncio.create_task(self._refill_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def take(self) -> Optional[str]:
+        """Pop a template, or None if the pool is empty. Wakes the refill task."""
+        self._wanted.set()
+        if not self._templates:
+            self.fallbacks += 1
+            return None
+        self.served += 1
+        return self._templates.popleft()
+
+    @staticmethod
+    def is_valid(template: Optional[str]) -> bool:
+        # Exactly one slot, no other braces, and no pings the model made up
+        return (
+            template is not None
+            and 10 <= len(template) <= 1000
+            and template.count(MENTION_SLOT) == 1
+            and template.count("{") == 1 and template.count("}") == 1
+            and "@" not in template
+        )
+
+    async def _refill_loop(self) -> None:
+        while True:
+            await self._wanted.wait()
+            self._wanted.clear()
+            rejected_in_a_row = 0
+            while len(self._templates) < self.size:
+                response = await self.api_client.make_groq_request(TEMPLATE_MESSAGES, profile="welcome",
+                                                                  priority=PRIORITY_BACKGROUND)
+                template = response.strip() if response else None
+                if self.is_valid(template):
+                    self._templates.append(template)
+                    self.generated += 1
+                    rejected_in_a_row = 0
+                    continue
+                if response is not None:
+                    logger.debug("Rejected welcome template: %r", response)
+                    self.rejected += 1
+                    rejected_in_a_row += 1
+                    if rejected_in_a_row < 3:
+                        continue
+                logger.warning("Welcome template generation failed, retrying in %ds", WELCOME_REFILL_RETRY)
+                rejected_in_a_row = 0
+                await asyncio.sleep(WELCOME_REFILL_RETRY)
+
+    def stats(self):
+        return {
+            'ready': len(self._templates),
+            'capacity': self.size,
+            'generated': self.generated,
+            'rejected': self.rejected,
+            'served': self.served,
+            'fallbacks': self.fallbacks,
+        }
+
+
+class Welcomer:
+    """Posts welcomes from the template pool and batches join bursts.
+
+    The first join after a quiet period is welcomed immediately. Joins within
+    `window` seconds of the last welcome are collected and greeted together
+    in one message when the window closes.
+    """
+
+    def __init__(self, api_client, channels: ChannelRegistry, window: float = WELCOME_BATCH_WINDOW,
+                 batch_max: int = WELCOME_BATCH_MAX):
+        self.pool = WelcomePool(api_client)
+        self.channels = channels
+        self.window = window
+        self.batch_max = batch_max
+        self._pending: List[discord.Member] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_sent = float('-inf')
+        self.messages_sent = 0
+        self.members_welcomed = 0
+
+    def start(self) -> None:
+        self.pool.start()
+
+    async def stop(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        await self.pool.stop()
+
+    async def member_joined(self, member: discord.Member) -> None:
+        self._pending.append(member)
+        if self._flush_task is not None:
+            return
+        delay = self._last_sent + self.window - time.monotonic()
+        if delay <= 0:
+            await self._flush()
+        else:
+            self._flush_task = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        await self._flush()
+
+    async def _flush(self) -> None:
+        members, self._pending = self._pending, []
+        self._last_sent = time.monotonic()
+        channel = self.channels.get_by_id(WELCOME_CHANNEL_ID)
+        if not channel:
+            logger.warning("Welcome channel %s not found", WELCOME_CHANNEL_ID)
+            return
+
+        for start in range(0, len(members), self.batch_max):
+            batch = members[start:start + self.batch_max]
+            mention = format_mentions(batch)
+            template = self.pool.take()
+            text = template.replace(MENTION_SLOT, mention) if template else default_welcome(mention)
+            try:
+                await channel.send(text, allowed_mentions=discord.AllowedMentions(everyone=False, roles=False, users=True))
+            except discord.HTTPException as e:
+                logger.error("Failed to send welcome message: %s", e)
+                continue
+            self.messages_sent += 1
+            self.members_welcomed += len(batch)
+            for _ in batch:
+                increment_count("welcome")
+            logger.info("Welcomed %s%s", ", ".join(m.name for m in batch),
+                        "" if template else " (default text, template pool empty)")
+
+    def stats(self):
+        return {
+            'messages_sent': self.messages_sent,
+            'members_welcomed': self.members_welcomed,
+            'pending': len(self._pending),
+            **self.pool.stats(),
+        }